@@ -11,6 +11,7 @@ import configparser
 import time
 import multiprocessing
 import pandas as pd
+from pbgui_purefunc import lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from pbgui_func import PBGDIR, pb7dir, pb7venv, validateJSON, config_pretty_str, load_symbols_from_ini, error_popup
 import uuid
 from Base import Base
@@ -287,10 +288,12 @@ class BacktestV7Queue:
                 subprocess.Popen(cmd, stdout=log, stderr=log, cwd=PBGDIR, text=True, creationflags=creationflags)
             else:
                 subprocess.Popen(cmd, stdout=log, stderr=log, cwd=PBGDIR, text=True, start_new_session=True)
+            forget_service("backtestv7")
 
     def stop(self):
         if self.is_running():
             self.pid().kill()
+            forget_service("backtestv7")
 
     def is_running(self):
         if self.pid():
@@ -298,6 +301,15 @@ class BacktestV7Queue:
         return False
 
     def pid(self):
+        alive = service_alive("backtestv7")
+        if alive is False:
+            return None
+        if alive:
+            try:
+                return psutil.Process(service_pid("backtestv7"))
+            except (psutil.NoSuchProcess, ValueError, TypeError):
+                return None
+        # No lock file (started by an older version), scan the processes
         for process in psutil.process_iter():
             try:
                 cmdline = process.cmdline()
@@ -866,7 +878,11 @@ def main():
     logging.getLogger("streamlit.runtime.state.session_state_proxy").disabled=True
     logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled=True
     bt = BacktestV7Queue()
+    if not lock_service("backtestv7", retry=2):
+        print(f'{datetime.datetime.now().isoformat(sep=" ", timespec="seconds")} Error: BacktestV7 already started')
+        return
     while True:
+        heartbeat_service("backtestv7")
         bt.load()
         for item in bt.items:
             while bt.running() >= bt.cpu:
@@ -0,0 +1,108 @@
+"""
+Metrics collects PBRun values in the Prometheus text exposition format.
+
+PBRun fills the metrics once per loop and publishes them as text. The text can be served on a local HTTP endpoint
+(http://127.0.0.1:<port>/metrics) and/or written to a file for the node_exporter textfile collector.
+Scrapes only return the last published text, they never touch the bots.
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pbgui_purefunc import save_text_atomic
+import threading
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+def format_value(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the last published text on /metrics."""
+    metrics = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ["/", "/metrics"]:
+            self.send_error(404)
+            return
+        body = self.metrics.text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Do not spam PBRun.log with every scrape
+        pass
+
+class Metrics():
+    """Stores metrics as name -> (type, help, {suffix and labels: value}) and renders them."""
+    def __init__(self, prefix: str = "pbrun"):
+        self.prefix = prefix
+        self.metrics = {}
+        self.text = ""
+        self.server = None
+
+    def clear(self):
+        self.metrics = {}
+
+    def add(self, name: str, value, labels: dict = None, help: str = "", type: str = "gauge"):
+        """Set one sample. name is without prefix, labels is a dict of label name and value."""
+        name = f'{self.prefix}_{name}'
+        if name not in self.metrics:
+            self.metrics[name] = (type, help, {})
+        self.metrics[name][2][format_labels(labels)] = value
+
+    def add_histogram(self, name: str, buckets: list, counts: list, sum: float, count: int, labels: dict = None, help: str = ""):
+        """Set one histogram. counts[i] is the number of observations <= buckets[i], not cumulated."""
+        name = f'{self.prefix}_{name}'
+        if name not in self.metrics:
+            self.metrics[name] = ("histogram", help, {})
+        samples = self.metrics[name][2]
+        labels = labels if labels else {}
+        cumulated = 0
+        for le, bucket_count in zip(buckets, counts):
+            cumulated += bucket_count
+            samples[f'_bucket{format_labels({**labels, "le": le})}'] = cumulated
+        samples[f'_bucket{format_labels({**labels, "le": "+Inf"})}'] = count
+        samples[f'_sum{format_labels(labels)}'] = sum
+        samples[f'_count{format_labels(labels)}'] = count
+
+    def render(self) -> str:
+        lines = []
+        for name, (type, help, samples) in self.metrics.items():
+            if help:
+                lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {type}')
+            for labels, value in samples.items():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return "\n".join(lines) + "\n"
+
+    def publish(self, file: str = None):
+        """Render the metrics for the next scrape and write them to file if given."""
+        self.text = self.render()
+        if file:
+            save_text_atomic(file, self.text)
+
+    def serve(self, host: str, port: int):
+        """Start the HTTP endpoint in a daemon thread."""
+        if self.server:
+            return
+        handler = type("Handler", (MetricsHandler,), {"metrics": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="Metrics", daemon=True).start()
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
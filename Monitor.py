@@ -53,6 +53,8 @@ class Monitor():
         d_v7 = []
         d_multi = []
         d_single = []
+        # hourly cpu/memory history by "PB Version/Name"
+        history = server.history
         if server.monitor:
             for monitor in server.monitor:
                 info = ({
@@ -75,6 +77,8 @@ class Monitor():
                     # py = pnl_yesterday
                     # ct = pnl_counter_today
                     # cy = pnl_counter_yesterday
+                    # r = restarts
+                    # q = quarantined
                     'Name': monitor["u"],
                     'PB Version': monitor["p"],
                     'Version': monitor["v"],
@@ -93,7 +97,9 @@ class Monitor():
                     'Errors Yesterday': monitor["ey"],
                     'Last Traceback': monitor["t"],
                     'Tracebacks Today': monitor["tt"],
-                    'Tracebacks Yesterday': monitor["ty"]
+                    'Tracebacks Yesterday': monitor["ty"],
+                    'Restarts': monitor.get("r", 0),
+                    'Quarantined': monitor.get("q", False)
                 })
                 if info["PB Version"] == "7":
                     d_v7.append(info)
@@ -125,6 +131,9 @@ class Monitor():
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange', subset=['PNLs Today', 'PNLs Yesterday'])
             #PNL green if > 0, orange if 0 else red
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange' if x == 0 else 'color: red', subset=['PNL Today', 'PNL Yesterday'])
+            #Restarts green if 0 else orange, Quarantined red
+            sdf = sdf.map(lambda x: 'color: green' if x == 0 else 'color: orange', subset=['Restarts'])
+            sdf = sdf.map(lambda x: 'color: red' if x else 'color: green', subset=['Quarantined'])
             st.dataframe(data=sdf, use_container_width=True, height=36+(len(d_v7))*35, key="pbremote_v7_select" ,selection_mode='single-row', on_select="rerun", column_config=column_config)
             if v7_selected:
                 if v7_selected["selection"]["rows"]:
@@ -133,6 +142,7 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{d_v7[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{d_v7[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{d_v7[row]['Last Traceback']}]")
+                    self.view_history(history.get(f"{d_v7[row]['PB Version']}/{d_v7[row]['Name']}"))
         else:
             st.write("None")
         st.header(f"Running Multi Instances ({len(d_multi)}) {server.pb6_version}")
@@ -151,6 +161,9 @@ class Monitor():
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange', subset=['PNLs Today', 'PNLs Yesterday'])
             #PNL green if > 0, orange if 0 else red
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange' if x == 0 else 'color: red', subset=['PNL Today', 'PNL Yesterday'])
+            #Restarts green if 0 else orange, Quarantined red
+            sdf = sdf.map(lambda x: 'color: green' if x == 0 else 'color: orange', subset=['Restarts'])
+            sdf = sdf.map(lambda x: 'color: red' if x else 'color: green', subset=['Quarantined'])
             st.dataframe(data=sdf, use_container_width=True, height=36+(len(d_multi))*35, key="pbremote_multi_select" ,selection_mode='single-row', on_select="rerun", column_config=column_config)
             if multi_selected:
                 if multi_selected["selection"]["rows"]:
@@ -159,6 +172,7 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{d_multi[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{d_multi[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{d_multi[row]['Last Traceback']}]")
+                    self.view_history(history.get(f"{d_multi[row]['PB Version']}/{d_multi[row]['Name']}"))
         else:
             st.write("None")
         st.header(f"Running Single Instances ({len(d_single)}) {server.pb6_version}")
@@ -177,6 +191,9 @@ class Monitor():
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange', subset=['PNLs Today', 'PNLs Yesterday'])
             #PNL green if > 0, orange if 0 else red
             sdf = sdf.map(lambda x: 'color: green' if x > 0 else 'color: orange' if x == 0 else 'color: red', subset=['PNL Today', 'PNL Yesterday'])
+            #Restarts green if 0 else orange, Quarantined red
+            sdf = sdf.map(lambda x: 'color: green' if x == 0 else 'color: orange', subset=['Restarts'])
+            sdf = sdf.map(lambda x: 'color: red' if x else 'color: green', subset=['Quarantined'])
             st.dataframe(data=sdf, use_container_width=True, height=36+(len(d_single))*35, key="pbremote_single_select" ,selection_mode='single-row', on_select="rerun", column_config=column_config)
             if single_selected:
                 if single_selected["selection"]["rows"]:
@@ -185,9 +202,22 @@ class Monitor():
                     st.markdown(f":green[Last Info: ] :blue[{d_single[row]['Last Info']}]")
                     st.markdown(f":orange[Last Error: ] :blue[{d_single[row]['Last Error']}]")
                     st.markdown(f":red[Last Traceback: ] :blue[{d_single[row]['Last Traceback']}]")
+                    self.view_history(history.get(f"{d_single[row]['PB Version']}/{d_single[row]['Name']}"))
         else:
             st.write("None")
 
+    def view_history(self, history: dict):
+        """Chart of the hourly cpu and memory history from history.json"""
+        if not history:
+            return
+        index = [datetime.fromtimestamp(history["t"] + i * history["r"]) for i in range(len(history["c"]))]
+        df = pd.DataFrame({"CPU %": history["c"], "Memory MB": history["m"]}, index=index)
+        col_1, col_2 = st.columns([1,1])
+        with col_1:
+            st.line_chart(df["CPU %"], y_label="CPU %")
+        with col_2:
+            st.line_chart(df["Memory MB"], y_label="Memory MB")
+
     def load_monitor_config(self):
         st.session_state.mem_warning_v7 = load_ini("monitor", "mem_warning_v7")
         if st.session_state.mem_warning_v7 == "":
@@ -10,6 +10,7 @@ import configparser
 import time
 import multiprocessing
 from Exchange import Exchange
+from pbgui_purefunc import lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from pbgui_func import pb7dir, pb7venv, PBGDIR, load_symbols_from_ini, error_popup, info_popup
 import uuid
 from pathlib import Path, PurePath
@@ -275,10 +276,12 @@ class OptimizeV7Queue:
                 subprocess.Popen(cmd, stdout=log, stderr=log, cwd=PBGDIR, text=True, creationflags=creationflags)
             else:
                 subprocess.Popen(cmd, stdout=log, stderr=log, cwd=PBGDIR, text=True, start_new_session=True)
+            forget_service("optimizev7")
 
     def stop(self):
         if self.is_running():
             self.pid().kill()
+            forget_service("optimizev7")
 
     def is_running(self):
         if self.pid():
@@ -286,6 +289,15 @@ class OptimizeV7Queue:
         return False
 
     def pid(self):
+        alive = service_alive("optimizev7")
+        if alive is False:
+            return None
+        if alive:
+            try:
+                return psutil.Process(service_pid("optimizev7"))
+            except (psutil.NoSuchProcess, ValueError, TypeError):
+                return None
+        # No lock file (started by an older version), scan the processes
         for process in psutil.process_iter():
             try:
                 cmdline = process.cmdline()
@@ -1203,7 +1215,11 @@ def main():
     logging.getLogger("streamlit.runtime.state.session_state_proxy").disabled=True
     logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled=True
     opt = OptimizeV7Queue()
+    if not lock_service("optimizev7", retry=2):
+        print(f'{datetime.datetime.now().isoformat(sep=" ", timespec="seconds")} Error: OptimizeV7 already started')
+        return
     while True:
+        heartbeat_service("optimizev7")
         opt.load()
         for item in opt.items:
             while opt.running():
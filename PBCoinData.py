@@ -11,7 +11,8 @@ import platform
 import sys
 import os
 import traceback
-from io import TextIOWrapper
+import threading
+from pbgui_purefunc import set_logfile, reset_logfile, supervisor_request, lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from Exchange import Exchange, Exchanges
 
 SYMBOLMAP = {
@@ -166,16 +167,30 @@ class CoinData:
             self._vol_mcap = new_vol_mcap
             self.list_symbols()
 
+    def set_filter(self, exchange: str, market_cap: int, vol_mcap: float):
+        """Set exchange, market_cap and vol_mcap together and list the symbols only once."""
+        if self._exchange != exchange:
+            self._exchange = exchange
+            self._symbols = []
+            self.load_symbols()
+        self._market_cap = market_cap
+        self._vol_mcap = vol_mcap
+        self.approved_coins = []
+        self.ignored_coins = []
+        self.list_symbols()
+
     def run(self):
         if not self.is_running():
-            pbgdir = Path.cwd()
-            cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBCoinData.py')]
-            if platform.system() == "Windows":
-                creationflags = subprocess.DETACHED_PROCESS
-                creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            if not supervisor_request("PBCoinData", "start"):
+                pbgdir = Path.cwd()
+                cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBCoinData.py')]
+                if platform.system() == "Windows":
+                    creationflags = subprocess.DETACHED_PROCESS
+                    creationflags |= subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
+                else:
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            forget_service("pbcoindata")
             count = 0
             while True:
                 if count > 5:
@@ -188,7 +203,9 @@ class CoinData:
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBCoinData')
-            psutil.Process(self.my_pid).kill()
+            if not supervisor_request("PBCoinData", "stop", self.my_pid):
+                psutil.Process(self.my_pid).kill()
+            forget_service("pbcoindata")
 
     def restart(self):
         if self.is_running():
@@ -196,9 +213,14 @@ class CoinData:
             self.run()
 
     def is_running(self):
+        alive = service_alive("pbcoindata")
+        if alive is not None:
+            if alive:
+                self.my_pid = service_pid("pbcoindata")
+            return alive
         self.load_pid()
         try:
-            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith("pbcoindata.py") for sub in psutil.Process(self.my_pid).cmdline()):
+            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith(("pbcoindata.py", "pbsupervisor.py")) for sub in psutil.Process(self.my_pid).cmdline()):
                 return True
         except psutil.NoSuchProcess:
             pass
@@ -211,9 +233,13 @@ class CoinData:
                 self.my_pid = int(pid) if pid.isnumeric() else None
 
     def save_pid(self):
+        """Returns False if another process holds the lock of PBCoinData."""
+        if not lock_service("pbcoindata", retry=2):
+            return False
         self.my_pid = os.getpid()
         with open(self.pidfile, 'w') as f:
             f.write(str(self.my_pid))
+        return True
 
     def has_new_config(self):
         if Path('pbgui.ini').exists():
@@ -445,29 +471,32 @@ class CoinData:
                 ignored_coins.append(symbol)
         return approved_coins, ignored_coins
 
-def main():
+def main(stop: threading.Event = None):
+    if stop is None:
+        stop = threading.Event()
     pbgdir = Path.cwd()
     dest = Path(f'{pbgdir}/data/logs')
     if not dest.exists():
         dest.mkdir(parents=True)
     logfile = Path(f'{str(dest)}/PBCoinData.log')
-    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+    set_logfile(logfile)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBCoinData')
     pbcoindata = CoinData()
     if pbcoindata.is_running():
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBCoinData already started')
+        exit(1)
+    if not pbcoindata.save_pid():
+        reset_logfile()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBCoinData already started')
         exit(1)
-    pbcoindata.save_pid()
-    while True:
+    while not stop.is_set():
         try:
+            heartbeat_service("pbcoindata")
             if logfile.exists():
                 if logfile.stat().st_size >= 10485760:
                     logfile.replace(f'{str(logfile)}.old')
-                    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-                    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+                    set_logfile(logfile)
             pbcoindata.update_symbols()
             if not pbcoindata.is_data_fresh():
                 pbcoindata.load_data()
@@ -476,7 +505,7 @@ def main():
                     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Fetched CoinMarketCap data. Credits left this month: {pbcoindata.credits_left}')
                 else:
                     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Can not fetch CoinMarketCap data')
-            sleep(60)
+            stop.wait(60)
             pbcoindata.load_config()
         except Exception as e:
             print(f'Something went wrong, but continue {e}')
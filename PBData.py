@@ -4,7 +4,8 @@ import sys
 import os
 from pathlib import Path, PurePath
 from time import sleep
-from io import TextIOWrapper
+import threading
+from pbgui_purefunc import set_logfile, reset_logfile, supervisor_request, lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from datetime import datetime
 import platform
 import traceback
@@ -35,13 +36,15 @@ class PBData():
 
     def run(self):
         if not self.is_running():
-            cmd = [sys.executable, '-u', PurePath(f'{PBGDIR}/PBData.py')]
-            if platform.system() == "Windows":
-                creationflags = subprocess.DETACHED_PROCESS
-                creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=PBGDIR, text=True, creationflags=creationflags)
-            else:
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=PBGDIR, text=True, start_new_session=True)
+            if not supervisor_request("PBData", "start"):
+                cmd = [sys.executable, '-u', PurePath(f'{PBGDIR}/PBData.py')]
+                if platform.system() == "Windows":
+                    creationflags = subprocess.DETACHED_PROCESS
+                    creationflags |= subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=PBGDIR, text=True, creationflags=creationflags)
+                else:
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=PBGDIR, text=True, start_new_session=True)
+            forget_service("pbdata")
             count = 0
             while True:
                 if count > 5:
@@ -54,7 +57,9 @@ class PBData():
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBData')
-            psutil.Process(self.my_pid).kill()
+            if not supervisor_request("PBData", "stop", self.my_pid):
+                psutil.Process(self.my_pid).kill()
+            forget_service("pbdata")
 
     def restart(self):
         if self.is_running():
@@ -62,9 +67,14 @@ class PBData():
             self.run()
 
     def is_running(self):
+        alive = service_alive("pbdata")
+        if alive is not None:
+            if alive:
+                self.my_pid = service_pid("pbdata")
+            return alive
         self.load_pid()
         try:
-            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith("pbdata.py") for sub in psutil.Process(self.my_pid).cmdline()):
+            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith(("pbdata.py", "pbsupervisor.py")) for sub in psutil.Process(self.my_pid).cmdline()):
                 return True
         except psutil.NoSuchProcess:
             pass
@@ -77,9 +87,13 @@ class PBData():
                 self.my_pid = int(pid) if pid.isnumeric() else None
 
     def save_pid(self):
+        """Returns False if another process holds the lock of PBData."""
+        if not lock_service("pbdata", retry=2):
+            return False
         self.my_pid = os.getpid()
         with open(self.pidfile, 'w') as f:
             f.write(str(self.my_pid))
+        return True
     
     def load_fetch_users(self):
         pb_config = configparser.ConfigParser()
@@ -117,30 +131,33 @@ class PBData():
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Fetch balance for {user.name}')
                 self.db.update_balances(user)
 
-def main():
+def main(stop: threading.Event = None):
+    if stop is None:
+        stop = threading.Event()
     dest = Path(f'{PBGDIR}/data/logs')
     if not dest.exists():
         dest.mkdir(parents=True)
     logfile = Path(f'{str(dest)}/PBData.log')
-    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+    set_logfile(logfile)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBData')
     pbdata = PBData()
     if pbdata.is_running():
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBData already started')
         exit(1)
-    pbdata.save_pid()
-    while True:
+    if not pbdata.save_pid():
+        reset_logfile()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBData already started')
+        exit(1)
+    while not stop.is_set():
         try:
+            heartbeat_service("pbdata")
             if logfile.exists():
                 if logfile.stat().st_size >= 10485760:
                     logfile.replace(f'{str(logfile)}.old')
-                    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-                    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+                    set_logfile(logfile)
             pbdata.update_db()
-            sleep(1)
+            stop.wait(1)
         except Exception as e:
             print(f'Something went wrong, but continue {e}')
             traceback.print_exc()
@@ -11,18 +11,131 @@ import configparser
 import sys
 import os
 from pathlib import Path, PurePath
-from time import sleep
+from time import sleep, monotonic
+import random
 import glob
 import json
-from io import TextIOWrapper
+import threading
+from pbgui_purefunc import save_json_atomic, set_logfile, reset_logfile, supervisor_request, lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from datetime import datetime
 import platform
 from PBRun import PBRun
 from Status import InstancesStatus
+from RcloneRC import RcloneRC
+from SyncManifest import SyncManifest, TREES
 import shutil
 import hashlib
 import traceback
 import gzip
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+def run_rclone(rclone: RcloneRC, cmds: list, log, timeout: float = None):
+    """Runs rclone commands as jobs of the rclone rcd if there is one, otherwise as rclone processes.
+
+    timeout is per command, a command that takes longer is stopped.
+    """
+    pbgdir = Path.cwd()
+    for cmd in cmds:
+        if rclone and rclone.run(cmd, timeout or 3600, log):
+            continue
+        try:
+            if platform.system() == "Windows":
+                creationflags = subprocess.CREATE_NO_WINDOW
+                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, timeout=timeout, creationflags=creationflags)
+            else:
+                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: {" ".join(str(arg) for arg in cmd)} timeout after {timeout}s')
+
+# cmd dir: (file, (mtime_ns, size), decoded alive file) of the last alive file loaded from it
+ALIVE_CACHE = {}
+# cmd dir: (mtime_ns, sorted alive_*.cmd* files)
+ALIVE_GLOB = {}
+# history file: (mtime_ns, decoded history file)
+HISTORY_CACHE = {}
+
+def load_alive(file: Path):
+    """Decoded alive file, None if it is missing or corrupted. Only decoded again if mtime or size changed."""
+    try:
+        stat = os.stat(file)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = ALIVE_CACHE.get(str(file.parent))
+    if cached and cached[0] == str(file) and cached[1] == key:
+        return cached[2]
+    try:
+        if str(file).endswith('.gz'):
+            with gzip.open(file, "rt", encoding='utf-8') as f:
+                cfg = json.load(f)
+        else:
+            with open(file, "r", encoding='utf-8') as f:
+                cfg = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f'{str(file)} is corrupted {e}')
+        return None
+    ALIVE_CACHE[str(file.parent)] = (str(file), key, cfg)
+    return cfg
+
+def load_history(file: Path):
+    """Hourly cpu/memory history of all instances from history.json by "<pb_version>/<user>", empty if it is missing."""
+    try:
+        mtime = os.stat(file).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = HISTORY_CACHE.get(str(file))
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(file, "r", encoding='utf-8') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    HISTORY_CACHE[str(file)] = (mtime, history)
+    return history
+
+class TaskSchedule():
+    """Runs the tasks of the PBRemote loop on their own interval.
+
+    The next run of a task is delayed by up to jitter * interval, so servers started at the same time do not
+    hit the storage together. Tasks with max_interval back off when idle: every run that found nothing new
+    doubles the interval up to max_interval, a run with changes falls back to interval.
+    """
+    def __init__(self, jitter: float = 0.1):
+        self.jitter = jitter
+        self.intervals = {}
+        self.current = {}
+        self.next_run = {}
+
+    def every(self, name: str, interval: float, max_interval: float = None):
+        self.intervals[name] = (interval, max_interval or interval)
+        self.current[name] = interval
+
+    def due(self, name: str):
+        return monotonic() >= self.next_run.get(name, 0)
+
+    def done(self, name: str, changed: bool = True):
+        """Schedule the next run of name, changed is False if the run found nothing new."""
+        interval, max_interval = self.intervals[name]
+        if changed:
+            self.current[name] = interval
+        else:
+            self.current[name] = min(self.current[name] * 2, max_interval)
+        self.next_run[name] = monotonic() + self.current[name] * (1 + random.uniform(0, self.jitter))
+
+    def wake(self, name: str):
+        """Run name on the next loop."""
+        self.current[name] = self.intervals[name][0]
+        self.next_run[name] = 0
+
+    def wait_time(self):
+        """Seconds until the next task is due."""
+        if not self.intervals:
+            return 1
+        return max(min(self.next_run.get(name, 0) for name in self.intervals) - monotonic(), 0)
 
 class RemoteServer():
     def __init__(self, path: str):
@@ -62,6 +175,14 @@ class RemoteServer():
         self._pb7_version = "N/A"
         self._pb7_commit = None
         self.pbname = None
+        # trees synced once since start, later only changed instances are synced
+        self.synced = {}
+        # RcloneRC of the PBRemote daemon, None runs rclone as process
+        self.rclone = None
+        # tree: SyncManifest of the local copy of the tree
+        self.manifests = {}
+        # timeout of one rclone command in seconds, set by PBRemote, None waits forever
+        self.sync_timeout = None
         self.instances_status = InstancesStatus(f'{self.path}/status.json')
         self.instances_status.load()
         self.instances_status_single = InstancesStatus(f'{self.path}/status_single.json')
@@ -102,6 +223,8 @@ class RemoteServer():
     @property
     def monitor(self): return self._monitor
     @property
+    def history(self): return load_history(Path(f'{self._path}/history.json'))
+    @property
     def upgrades(self): return self._upgrades
     @property
     def reboot(self): return self._reboot
@@ -183,72 +306,74 @@ class RemoteServer():
         """
         Load the server's configuration.
         """
-        p = str(Path(f'{self._path}/alive_*.cmd*'))
-        alive_remote = glob.glob(p)
-        alive_remote.sort()
         self._name = PurePath(self._path).name[4:]
-        if alive_remote:
-            while len(alive_remote) > 0:
-                remote = Path(alive_remote.pop())
-                try:
-                    if str(remote).endswith('.gz'):
-                        with gzip.open(remote, "rt", encoding='utf-8') as f:
-                            cfg = json.load(f)
-                    else:
-                        with open(remote, "r", encoding='utf-8') as f:
-                            cfg = json.load(f)
-                    if "name" in cfg and "timestamp" in cfg:
-                        self._ts = cfg["timestamp"]
-                    if "startts" in cfg:
-                        self._startts = cfg["startts"]
-                    if "api_md5" in cfg:
-                        self._api_md5 = cfg["api_md5"]
-                    if "mem" in cfg:
-                        self._mem = cfg["mem"]
-                    if "swap" in cfg:
-                        self._swap = cfg["swap"]
-                    if "disk" in cfg:
-                        self._disk = cfg["disk"]
-                    if "cpu" in cfg:
-                        self._cpu = cfg["cpu"]
-                    if "boot" in cfg:
-                        self._boot = cfg["boot"]
-                    if "monitor" in cfg:
-                        self._monitor = cfg["monitor"]
-                    if "upgrades" in cfg:
-                        self._upgrades = cfg["upgrades"]
-                    if "reboot" in cfg:
-                        self._reboot = cfg["reboot"]
-                    if "pbgv" in cfg:
-                        self._pbgui_version = cfg["pbgv"]
-                    if "pbgc" in cfg:
-                        self._pbgui_commit = cfg["pbgc"]
-                    if "pb6v" in cfg:
-                        self._pb6_version = cfg["pb6v"]
-                    if "pb6c" in cfg:
-                        self._pb6_commit = cfg["pb6c"]
-                    if "pb7v" in cfg:
-                        self._pb7_version = cfg["pb7v"]
-                    if "pb7c" in cfg:
-                        self._pb7_commit = cfg["pb7c"]
-                    return
-                except Exception as e:
-                    print(f'{str(remote)} is corrupted {e}')
+        for remote in self.alive_files():
+            cfg = load_alive(remote)
+            if cfg is None:
+                continue
+            if "name" in cfg and "timestamp" in cfg:
+                self._ts = cfg["timestamp"]
+            if "startts" in cfg:
+                self._startts = cfg["startts"]
+            if "api_md5" in cfg:
+                self._api_md5 = cfg["api_md5"]
+            if "mem" in cfg:
+                self._mem = cfg["mem"]
+            if "swap" in cfg:
+                self._swap = cfg["swap"]
+            if "disk" in cfg:
+                self._disk = cfg["disk"]
+            if "cpu" in cfg:
+                self._cpu = cfg["cpu"]
+            if "boot" in cfg:
+                self._boot = cfg["boot"]
+            if "monitor" in cfg:
+                self._monitor = cfg["monitor"]
+            if "upgrades" in cfg:
+                self._upgrades = cfg["upgrades"]
+            if "reboot" in cfg:
+                self._reboot = cfg["reboot"]
+            if "pbgv" in cfg:
+                self._pbgui_version = cfg["pbgv"]
+            if "pbgc" in cfg:
+                self._pbgui_commit = cfg["pbgc"]
+            if "pb6v" in cfg:
+                self._pb6_version = cfg["pb6v"]
+            if "pb6c" in cfg:
+                self._pb6_commit = cfg["pb6c"]
+            if "pb7v" in cfg:
+                self._pb7_version = cfg["pb7v"]
+            if "pb7c" in cfg:
+                self._pb7_commit = cfg["pb7c"]
+            return
+
+    def alive_files(self):
+        """Alive files of the server, newest first.
+
+        alive.cmd.gz is always the newest. The alive_<timestamp>.cmd* files are only needed for servers
+        running an older version or if alive.cmd.gz is corrupted, the glob is only repeated if the directory changed.
+        """
+        yield Path(f'{self._path}/alive.cmd.gz')
+        try:
+            mtime = os.stat(self._path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        cached = ALIVE_GLOB.get(self._path)
+        if cached and cached[0] == mtime:
+            found = cached[1]
+        else:
+            found = sorted(glob.glob(str(Path(f'{self._path}/alive_*.cmd*'))))
+            ALIVE_GLOB[self._path] = (mtime, found)
+        for remote in reversed(found):
+            yield Path(remote)
 
     def sync_v7_down(self):
         """Sync the v7 configurations from the remote storage to the local machine."""
+        seq = self.instances_status_v7.seq
         if self.instances_status_v7.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status_v7.json from: {self.name}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync v7 from: {self.name}')
-            pbgdir = Path.cwd()
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{*.json}}', f'{self.bucket}/run_v7_{self.name}', PurePath(f'{pbgdir}/data/remote/run_v7_{self.name}')]
-            logfile = Path(f'{pbgdir}/data/logs/sync.log')
-            log = open(logfile,"ab")
-            if platform.system() == "Windows":
-                creationflags = subprocess.CREATE_NO_WINDOW
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True)
+            self.sync_down("run_v7", '{*.json}', self.instances_status_v7, seq)
             PBRun().update_status(self.instances_status_v7.status_file, self.name)
             status_ts = self.instances_status_v7.status_ts
             self.instances_status_v7.update_status()
@@ -256,18 +381,11 @@ class RemoteServer():
 
     def sync_multi_down(self):
         """Sync the multi configurations from the remote storage to the local machine."""
+        seq = self.instances_status.seq
         if self.instances_status.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status.json from: {self.name}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync multi from: {self.name}')
-            pbgdir = Path.cwd()
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{multi.hjson,*.json}}', f'{self.bucket}/multi_{self.name}', PurePath(f'{pbgdir}/data/remote/multi_{self.name}')]
-            logfile = Path(f'{pbgdir}/data/logs/sync.log')
-            log = open(logfile,"ab")
-            if platform.system() == "Windows":
-                creationflags = subprocess.CREATE_NO_WINDOW
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True)
+            self.sync_down("multi", '{multi.hjson,*.json}', self.instances_status, seq)
             PBRun().update_status(self.instances_status.status_file, self.name)
             status_ts = self.instances_status.status_ts
             self.instances_status.update_status()
@@ -275,23 +393,77 @@ class RemoteServer():
 
     def sync_single_down(self):
         """Sync the single configurations from the local machine to the remote storage."""
+        seq = self.instances_status_single.seq
         if self.instances_status_single.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status_single.json from: {self.name}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync single from: {self.name}')
-            pbgdir = Path.cwd()
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{instance.cfg,config.json}}', f'{self.bucket}/instances_{self.name}', PurePath(f'{pbgdir}/data/remote/instances_{self.name}')]
-            logfile = Path(f'{pbgdir}/data/logs/sync.log')
-            log = open(logfile,"ab")
-            if platform.system() == "Windows":
-                creationflags = subprocess.CREATE_NO_WINDOW
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True)
+            self.sync_down("instances", '{instance.cfg,config.json}', self.instances_status_single, seq)
             PBRun().update_status(self.instances_status_single.status_file, self.name)
             status_ts = self.instances_status_single.status_ts
             self.instances_status_single.update_status()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Update status_single ts: {self.name} old: {status_ts} new: {self.instances_status_single.status_ts}')
 
+    def sync_down(self, tree: str, include: str, status: InstancesStatus, seq: int):
+        """Sync the instance directories of tree that changed after seq, or the whole tree.
+
+        The whole tree is synced on the first sync, if the journal of status does not reach back to seq,
+        if instances were removed or if too many instances changed.
+        """
+        pbgdir = Path.cwd()
+        src = f'{self.bucket}/{tree}_{self.name}'
+        dest = PurePath(f'{pbgdir}/data/remote/{tree}_{self.name}')
+        manifest = SyncManifest(f'{pbgdir}/data/remote/cmd_{self.name}/manifest_{tree}.json')
+        if manifest.load() and manifest.seq and manifest.seq == status.seq:
+            if self.sync_manifest(tree, manifest, src, dest):
+                self.synced[tree] = True
+                return
+        changes = status.changes_since(seq) if self.synced.get(tree) else None
+        if changes is None or len(changes) > 10 or any(op == "remove" for _, _, op in changes):
+            cmds = [['rclone', 'sync', '-v', '--include', include, src, dest]]
+        else:
+            names = sorted({name for _, name, _ in changes})
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync changed {tree} from: {self.name} {names}')
+            cmds = [['rclone', 'sync', '-v', '--include', include, f'{src}/{name}', PurePath(f'{dest}/{name}')] for name in names]
+        logfile = Path(f'{pbgdir}/data/logs/sync.log')
+        with open(logfile,"ab") as log:
+            run_rclone(self.rclone, cmds, log, self.sync_timeout)
+        self.synced[tree] = True
+
+    def sync_manifest(self, tree: str, manifest: SyncManifest, src: str, dest: PurePath):
+        """Fetch the files that differ from the manifest and remove the files it does not list.
+
+        Returns:
+            bool: False if the local tree does not match the manifest afterwards.
+        """
+        pbgdir = Path.cwd()
+        local = self.manifests.setdefault(tree, SyncManifest())
+        local.scan(dest, manifest.patterns)
+        fetch, remove = manifest.diff(local)
+        if not fetch and not remove:
+            return True
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync {tree} from: {self.name} fetch: {len(fetch)} remove: {len(remove)}')
+        for path in remove:
+            Path(f'{dest}/{path}').unlink(missing_ok=True)
+            # remove the instance directory if it is empty now
+            parent = Path(f'{dest}/{path}').parent
+            while parent != Path(dest) and parent.exists() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        if fetch:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+                f.write("\n".join(fetch) + "\n")
+                files_from = f.name
+            logfile = Path(f'{pbgdir}/data/logs/sync.log')
+            with open(logfile,"ab") as log:
+                run_rclone(self.rclone, [['rclone', 'copy', '-v', '--files-from', files_from, src, dest]], log, self.sync_timeout)
+            Path(files_from).unlink(missing_ok=True)
+        local.scan(dest, manifest.patterns)
+        fetch, remove = manifest.diff(local)
+        if fetch or remove:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: {tree} from: {self.name} does not match manifest, sync all')
+            return False
+        return True
+
     def sync_api(self):
         """
         Sync the API keys from the remote storage to the local machine.
@@ -350,6 +522,8 @@ class PBRemote():
         self.startts = None
         self.alivets = 0
         self.systemts = 0
+        # trees synced up once since start, later only changed instances are synced
+        self.synced = {}
         self.rtd = 0
         pbgdir = Path.cwd()
         pb_config = configparser.ConfigParser()
@@ -364,6 +538,43 @@ class PBRemote():
             self.role = pb_config.get("main", "role")
         else:
             self.role = "slave"
+        # Schedule of the main loop in seconds. status_down backs off to status_max_interval if nothing changed,
+        # keep it well below 200s, the age at which a server is shown offline.
+        self.schedule = TaskSchedule()
+        if pb_config.has_option("pbremote", "jitter"):
+            self.schedule.jitter = float(pb_config.get("pbremote", "jitter"))
+        intervals = {"up": 5, "alive": 60, "status_down": 20, "status_max": 60, "servers": 30, "api": 60}
+        for task in intervals:
+            if pb_config.has_option("pbremote", f'{task}_interval'):
+                intervals[task] = float(pb_config.get("pbremote", f'{task}_interval'))
+        self.schedule.every("up", intervals["up"])
+        self.schedule.every("alive", intervals["alive"])
+        self.schedule.every("status_down", intervals["status_down"], intervals["status_max"])
+        self.schedule.every("servers", intervals["servers"])
+        self.schedule.every("api", intervals["api"])
+        self.status_fingerprint = None
+        # tree: SyncManifest of the local tree, published with the status file
+        self.manifests = {}
+        # rclone rcd of the PBRemote daemon, started by main()
+        self.rclone = None
+        self.rclone_rcd = True
+        if pb_config.has_option("pbremote", "rclone_rcd"):
+            self.rclone_rcd = pb_config.getboolean("pbremote", "rclone_rcd")
+        # Remote servers are synced down in parallel by sync_workers threads, a server that takes longer
+        # than sync_timeout seconds is left behind and skipped until its sync is finished.
+        self.sync_workers = 4
+        if pb_config.has_option("pbremote", "sync_workers"):
+            self.sync_workers = int(pb_config.get("pbremote", "sync_workers"))
+        self.sync_timeout = 300
+        if pb_config.has_option("pbremote", "sync_timeout"):
+            self.sync_timeout = float(pb_config.get("pbremote", "sync_timeout"))
+        self._executor = None
+        # server name: (future, start) of the running sync
+        self.pending = {}
+        # servers with a sync running longer than sync_timeout, already reported
+        self.timed_out = set()
+        self.last_sync_file = Path(f'{pbgdir}/data/cmd/last_sync.json')
+        self.last_sync = self.load_last_sync()
         # Init pbdirs
         self.pbdir = None
         self.pb7dir = None
@@ -373,8 +584,7 @@ class PBRemote():
             self.pb7dir = pb_config.get("main", "pb7dir")
         if not any([self.pbdir, self.pb7dir]):
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: No passivbot directory configured in pbgui.ini')
                 exit(1)
             else:
@@ -398,8 +608,7 @@ class PBRemote():
         self.rclone_installed = self.is_rclone_installed()
         if not self.rclone_installed:
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone not installed')
                 exit(1)
             else:
@@ -408,8 +617,7 @@ class PBRemote():
         self.buckets = self.fetch_buckets()
         if not self.buckets:
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: No buckets found')
                 exit(1)
             else:
@@ -418,8 +626,7 @@ class PBRemote():
         self.load_config()
         if not self.bucket:
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: bucket not configured. Please configure bucket in pbgui.ini\n[pbremote]\nbucket = <bucket_name>:')
                 exit(1)
             else:
@@ -453,6 +660,9 @@ class PBRemote():
     def monitor(self):
         return self.load_monitor()
     @property
+    def history(self):
+        return load_history(Path(f'{self.cmd_path}/history.json'))
+    @property
     def pb7_version(self):
         return self.local_run.pb7_version
     @property
@@ -515,23 +725,24 @@ class PBRemote():
         else:
             return False
 
-    def sync(self, direction: str, spath: str):
+    def sync(self, direction: str, spath: str, names: list = None):
         """
         Synchronise from the local server to the remote storage server.
         
         Files it sends from local to remote : 
             For cmd files:
-                - alive_*.cmd
+                - alive_*.cmd, alive.cmd.gz
                 - api-keys.json
+                - history.json
             For instances: 
                 - instance.cfg
                 - config.json
             For status: 
                 - status.json
-                - alive_*.cmd
+                - alive_*.cmd, alive.cmd.gz
             For status_single: 
                 - status_single.json
-                - alive_*.cmd
+                - alive_*.cmd, alive.cmd.gz
             For multi :
                 - multi.hjson
                 - *.json
@@ -539,18 +750,19 @@ class PBRemote():
         Args:
             direction (str): Either "up" (sync from local to remote) or "down" (sync from remote to local).
             spath (str): The specific path to synchronize (e.g., "cmd", "instances", "status").
+            names (list, optional): Sync only these instance directories of "instances", "run_v7" or "multi".
         """
         pbgdir = Path.cwd()
         if direction == 'up' and spath == 'cmd':
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive_*.cmd*,api-keys.json}}', PurePath(f'{pbgdir}/data/{spath}'), f'{self.bucket_dir}/{spath}_{self.name}']
+            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive*.cmd*,api-keys.json,history.json}}', PurePath(f'{pbgdir}/data/{spath}'), f'{self.bucket_dir}/{spath}_{self.name}']
         elif direction == 'up' and spath == 'instances':
             cmd = ['rclone', 'sync', '-v', '--include', f'{{instance.cfg,config.json}}', PurePath(f'{pbgdir}/data/{spath}'), f'{self.bucket_dir}/{spath}_{self.name}']
         elif direction == 'up' and spath == 'status':
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive_*.cmd*,status.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
+            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive*.cmd*,status.json,manifest_multi.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
         elif direction == 'up' and spath == 'status_single':
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive_*.cmd*,status_single.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
+            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive*.cmd*,status_single.json,manifest_instances.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
         elif direction == 'up' and spath == 'status_v7':
-            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive_*.cmd*,status_v7.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
+            cmd = ['rclone', 'sync', '-v', '--include', f'{{alive*.cmd*,status_v7.json,manifest_run_v7.json}}', PurePath(f'{pbgdir}/data/cmd'), f'{self.bucket_dir}/cmd_{self.name}']
         elif direction == 'up' and spath == 'run_v7':
             cmd = ['rclone', 'sync', '-v', '--include', f'{{*.json}}', PurePath(f'{pbgdir}/data/{spath}'), f'{self.bucket_dir}/{spath}_{self.name}']
         elif direction == 'up' and spath == 'multi':
@@ -558,55 +770,167 @@ class PBRemote():
         elif direction == 'down' and spath == 'master':
             cmd = ['rclone', 'sync', '-v', '--exclude', f'{{cmd_{self.name}/*,instances_**,multi_**,run_v7_**}}', f'{self.bucket_dir}', PurePath(f'{pbgdir}/data/remote')]
         elif direction == 'down' and spath == 'slave':
-            cmd = ['rclone', 'sync', '-v', '--exclude', f'{{cmd_{self.name}/*,cmd_**/alive_*.cmd*,instances_**,multi_**,run_v7_**}}', f'{self.bucket_dir}', PurePath(f'{pbgdir}/data/remote')]
+            cmd = ['rclone', 'sync', '-v', '--exclude', f'{{cmd_{self.name}/*,cmd_**/alive*.cmd*,instances_**,multi_**,run_v7_**}}', f'{self.bucket_dir}', PurePath(f'{pbgdir}/data/remote')]
+        cmds = [cmd]
+        if names is not None and spath in ["instances", "run_v7", "multi"]:
+            # cmd: rclone sync -v --include <filter> <local tree> <remote tree>
+            cmds = [cmd[:4] + [PurePath(f'{cmd[4]}/{name}'), f'{cmd[5]}/{name}'] for name in names]
         logfile = Path(f'{pbgdir}/data/logs/sync.log')
         if logfile.exists():
             if logfile.stat().st_size >= 10485760:
                 logfile.replace(f'{pbgdir}/data/logs/sync.log.old')
                 logfile = Path(f'{pbgdir}/data/logs/sync.log')
-        log = open(logfile,"ab")
-        if platform.system() == "Windows":
-            creationflags = subprocess.CREATE_NO_WINDOW
-            subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True, creationflags=creationflags)
-        else:
-            subprocess.run(cmd, stdout=log, stderr=log, cwd=pbgdir, text=True)
+        with open(logfile,"ab") as log:
+            run_rclone(self.rclone, cmds, log)
+
+    def changed_names(self, spath: str, status: InstancesStatus, seq: int):
+        """Instance directories changed after seq, None if the whole tree must be synced."""
+        if spath not in self.synced:
+            return None
+        changes = status.changes_since(seq)
+        if changes is None or len(changes) > 10 or any(op == "remove" for _, _, op in changes):
+            return None
+        return sorted({name for _, name, _ in changes})
+
+    @property
+    def executor(self):
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self.sync_workers, thread_name_prefix="PBRemote")
+        return self._executor
+
+    def sync_server(self, server: RemoteServer):
+        server.load()
+        server.sync_v7_down()
+        server.sync_multi_down()
+        server.sync_single_down()
+        return round(datetime.now().timestamp())
+
+    def sync_servers(self):
+        """Submit the down sync of every remote server to the worker pool, without waiting for them.
+
+        A slow or failing server does not hold back the others or the main loop. A server that is still
+        syncing from a previous round is skipped. The results are collected by collect_syncs().
+        """
+        self.collect_syncs()
+        for server in self.remote_servers:
+            if server.name in self.pending:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: Sync from: {server.name} still running, skip')
+                continue
+            server.sync_timeout = self.sync_timeout
+            self.pending[server.name] = (self.executor.submit(self.sync_server, server), monotonic())
+
+    def collect_syncs(self):
+        """Record the finished syncs in last_sync and report the ones running longer than sync_timeout. Never blocks."""
+        changed = False
+        for name, (future, start) in list(self.pending.items()):
+            last = self.last_sync.setdefault(name, {})
+            if not future.done():
+                if monotonic() - start > self.sync_timeout and name not in self.timed_out:
+                    print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Sync from: {name} timeout after {self.sync_timeout}s')
+                    self.timed_out.add(name)
+                    last["ts"] = round(datetime.now().timestamp())
+                    last["error"] = f'timeout after {self.sync_timeout}s'
+                    changed = True
+                continue
+            del self.pending[name]
+            self.timed_out.discard(name)
+            error = future.exception()
+            if error:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Sync from: {name} {error}')
+                traceback.print_exception(type(error), error, error.__traceback__)
+                last["ts"] = round(datetime.now().timestamp())
+                last["error"] = str(error)
+            else:
+                last["ts"] = last["ok"] = future.result()
+                last.pop("error", None)
+            changed = True
+        if changed:
+            self.save_last_sync()
+
+    def load_last_sync(self):
+        """Last sync of the remote servers: {name: {"ts": last sync, "ok": last successful sync, "error": last error}}"""
+        try:
+            with open(self.last_sync_file, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_last_sync(self):
+        servers = [server.name for server in self.remote_servers]
+        self.last_sync = {name: last for name, last in self.last_sync.items() if name in servers}
+        save_json_atomic(self.last_sync_file, self.last_sync, indent=4)
+
+    def save_manifest(self, tree: str, status: InstancesStatus):
+        """Save data/cmd/manifest_<tree>.json, it is uploaded with the status file of the tree."""
+        pbgdir = Path.cwd()
+        manifest = self.manifests.setdefault(tree, SyncManifest(f'{pbgdir}/data/cmd/manifest_{tree}.json'))
+        manifest.scan(Path(f'{pbgdir}/data/{tree}'), TREES[tree])
+        manifest.seq = status.seq
+        manifest.save()
 
     def sync_status_down(self):
+        """Sync the cmd dirs of all servers down. Returns True if a status file or api-keys.json of a server changed."""
         if self.role == "master":
             self.sync('down', 'master')
         else:
             self.sync('down', 'slave')
+        fingerprint = self.load_status_fingerprint()
+        changed = fingerprint != self.status_fingerprint
+        self.status_fingerprint = fingerprint
+        return changed
+
+    def load_status_fingerprint(self):
+        """mtime and size of the synced status files and api-keys.json, alive files change every minute and are ignored."""
+        pbgdir = Path.cwd()
+        fingerprint = []
+        for remote in sorted(glob.glob(str(Path(f'{pbgdir}/data/remote/cmd_*')))):
+            for file in ["status.json", "status_single.json", "status_v7.json", "api-keys.json"]:
+                try:
+                    stat = os.stat(f'{remote}/{file}')
+                    fingerprint.append((remote, file, stat.st_mtime_ns, stat.st_size))
+                except FileNotFoundError:
+                    pass
+        return fingerprint
 
     def sync_v7_up(self):
+        seq = self.local_run.instances_status_v7.seq
         if self.local_run.instances_status_v7.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status_v7.json from: {self.name}')
             status_ts = self.local_run.instances_status_v7.status_ts
             self.local_run.instances_status_v7.update_status()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Update status_v7 ts: {self.name} old: {status_ts} new: {self.local_run.instances_status_v7.status_ts}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync v7 up: {self.name}')
-            self.sync('up', 'run_v7')
+            self.sync('up', 'run_v7', self.changed_names('run_v7', self.local_run.instances_status_v7, seq))
+            self.synced['run_v7'] = True
+            self.save_manifest('run_v7', self.local_run.instances_status_v7)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync status_v7.json up: {self.name}')
             self.sync('up', 'status_v7')
 
     def sync_multi_up(self):
+        seq = self.local_run.instances_status.seq
         if self.local_run.instances_status.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status.json from: {self.name}')
             status_ts = self.local_run.instances_status.status_ts
             self.local_run.instances_status.update_status()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Update status ts: {self.name} old: {status_ts} new: {self.local_run.instances_status.status_ts}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync multi up: {self.name}')
-            self.sync('up', 'multi')
+            self.sync('up', 'multi', self.changed_names('multi', self.local_run.instances_status, seq))
+            self.synced['multi'] = True
+            self.save_manifest('multi', self.local_run.instances_status)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync status.json up: {self.name}')
             self.sync('up', 'status')
     
     def sync_single_up(self):
+        seq = self.local_run.instances_status_single.seq
         if self.local_run.instances_status_single.has_new_status():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} New status_single.json from: {self.name}')
             status_ts = self.local_run.instances_status_single.status_ts
             self.local_run.instances_status_single.update_status()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Update status_single ts: {self.name} old: {status_ts} new: {self.local_run.instances_status_single.status_ts}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync single up: {self.name}')
-            self.sync('up', 'instances')
+            self.sync('up', 'instances', self.changed_names('instances', self.local_run.instances_status_single, seq))
+            self.synced['instances'] = True
+            self.save_manifest('instances', self.local_run.instances_status_single)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Sync status_single.json up: {self.name}')
             self.sync('up', 'status_single')
 
@@ -639,24 +963,27 @@ class PBRemote():
         path_v7 = PurePath(f'{pbgdir}/data/run_v7/')
         path_multi = PurePath(f'{pbgdir}/data/multi/')
         path_single = PurePath(f'{pbgdir}/data/instances/')
-        for instance in self.local_run.instances_status.instances:
-            if instance.running:
-                monitor_file = Path(f'{path_multi}/{instance.name}/monitor.json')
-                if Path(monitor_file).exists():
-                    with open(monitor_file, "r", encoding='utf-8') as f:
-                        monitor.append(json.load(f))
-        for instance in self.local_run.instances_status_single.instances:
-            if instance.running:
-                monitor_file = Path(f'{path_single}/{instance.name}/monitor.json')
-                if Path(monitor_file).exists():
-                    with open(monitor_file, "r", encoding='utf-8') as f:
-                        monitor.append(json.load(f))
-        for instance in self.local_run.instances_status_v7.instances:
-            if instance.running:
-                monitor_file = Path(f'{path_v7}/{instance.name}/monitor.json')
-                if Path(monitor_file).exists():
-                    with open(monitor_file, "r", encoding='utf-8') as f:
-                        monitor.append(json.load(f))
+        monitors = None
+        if self.local_run.monitors_file:
+            # PBRun writes all monitors to one file
+            monitors_file = Path(f'{self.cmd_path}/monitors.json')
+            if monitors_file.exists():
+                with open(monitors_file, "r", encoding='utf-8') as f:
+                    monitors = json.load(f)
+        for instances, path, pb_version in [
+            (self.local_run.instances_status.instances, path_multi, "6"),
+            (self.local_run.instances_status_single.instances, path_single, "s"),
+            (self.local_run.instances_status_v7.instances, path_v7, "7")]:
+            for instance in instances:
+                if instance.running:
+                    if monitors is not None:
+                        if f'{pb_version}/{instance.name}' in monitors:
+                            monitor.append(monitors[f'{pb_version}/{instance.name}'])
+                        continue
+                    monitor_file = Path(f'{path}/{instance.name}/monitor.json')
+                    if Path(monitor_file).exists():
+                        with open(monitor_file, "r", encoding='utf-8') as f:
+                            monitor.append(json.load(f))
         return monitor
 
     def alive(self):
@@ -665,14 +992,9 @@ class PBRemote():
         If there are more than 9 alive files, it will delete the oldest one.
         """
         timestamp = round(datetime.now().timestamp())
-        if timestamp - self.systemts > 3600:
-            self.local_run.load_versions()
-            self.local_run.load_git_commits()
-            self.local_run.has_upgrades()
-            self.local_run.has_reboot()
-            self.systemts = timestamp
-        if timestamp - self.alivets < 60:
-            return
+        # versions are probed in the background, alive only uses the cached results
+        self.local_run.probe_versions()
+        # called every alive_interval by the main loop
         self.alivets = timestamp
         # self.mem = psutil.virtual_memory()
         # self.swap = psutil.swap_memory()
@@ -704,6 +1026,10 @@ class PBRemote():
         cfile = Path(f'{self.cmd_path}/alive_{timestamp}.cmd.gz')
         with gzip.open(cfile, "wt", encoding='utf-8') as f:
             json.dump(cfg, f)
+        # alive.cmd.gz is always the newest alive file, peers read it without a glob
+        tmp = Path(f'{self.cmd_path}/alive.tmp')
+        shutil.copy(cfile, tmp)
+        tmp.replace(f'{self.cmd_path}/alive.cmd.gz')
         # with open(cfile, "w", encoding='utf-8') as f:
         #     json.dump(cfg, f)
         self.sync('up', 'cmd')
@@ -741,6 +1067,7 @@ class PBRemote():
             rserver.pb7dir = self.pb7dir
             rserver.bucket = self.bucket_dir
             rserver.pbname = self.name
+            rserver.rclone = self.rclone
             rserver.load()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Add Server: {rserver.name}')
             self.add(rserver)
@@ -759,6 +1086,7 @@ class PBRemote():
             rserver.pb7dir = self.pb7dir
             rserver.bucket = self.bucket_dir
             rserver.pbname = self.name
+            rserver.rclone = self.rclone
             rserver.load()
             for server in self.remote_servers:
                 if rserver.name == server.name:
@@ -769,14 +1097,16 @@ class PBRemote():
     def run(self):
         """Starts PBRemote in unbuffered mode, and send an error message if it does not open every 10 secondes."""
         if not self.is_running():
-            pbgdir = Path.cwd()
-            cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBRemote.py')]
-            if platform.system() == "Windows":
-                creationflags = subprocess.DETACHED_PROCESS
-                creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            if not supervisor_request("PBRemote", "start"):
+                pbgdir = Path.cwd()
+                cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBRemote.py')]
+                if platform.system() == "Windows":
+                    creationflags = subprocess.DETACHED_PROCESS
+                    creationflags |= subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
+                else:
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            forget_service("pbremote")
             count = 0
             while True:
                 if count > 5:
@@ -790,12 +1120,19 @@ class PBRemote():
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBRemote')
-            psutil.Process(self.my_pid).kill()
+            if not supervisor_request("PBRemote", "stop", self.my_pid):
+                psutil.Process(self.my_pid).kill()
+            forget_service("pbremote")
 
     def is_running(self):
+        alive = service_alive("pbremote")
+        if alive is not None:
+            if alive:
+                self.my_pid = service_pid("pbremote")
+            return alive
         self.load_pid()
         try:
-            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith("pbremote.py") for sub in psutil.Process(self.my_pid).cmdline()):
+            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith(("pbremote.py", "pbsupervisor.py")) for sub in psutil.Process(self.my_pid).cmdline()):
                 return True
         except psutil.NoSuchProcess:
             pass
@@ -813,9 +1150,13 @@ class PBRemote():
                 self.my_pid = int(pid) if pid.isnumeric() else None
 
     def save_pid(self):
+        """Returns False if another process holds the lock of PBRemote."""
+        if not lock_service("pbremote", retry=2):
+            return False
         self.my_pid = os.getpid()
         with open(self.pidfile, 'w') as f:
             f.write(str(self.my_pid))
+        return True
 
     def load_config(self):
         """Load the bucket name used in the remote storage from pbgui.ini."""
@@ -859,7 +1200,7 @@ class PBRemote():
         return []
 
 
-def main():
+def main(stop: threading.Event = None):
     """
     Main function of PBRemote, responsible for sharing data from one server to another.
 
@@ -868,52 +1209,77 @@ def main():
     - Logs in pbgui/data/logs/PBRemote.log and creates a .old file if the file is >10MB.
     - 
     """
+    if stop is None:
+        stop = threading.Event()
     pbgdir = Path.cwd()
     dest = Path(f'{pbgdir}/data/logs')
     if not dest.exists():
         dest.mkdir(parents=True)
     logfile = Path(f'{str(dest)}/PBRemote.log')
-    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+    set_logfile(logfile)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Init: PBRemote')
     remote = PBRemote()
     if remote.is_running():
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBRemote already started')
+        exit(1)
+    if not remote.save_pid():
+        reset_logfile()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBRemote already started')
         exit(1)
-    remote.save_pid()
     if not remote.bucket:
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
         print(f'Error: {remote.error}')
         exit(1)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBRemote {remote.bucket}')
     remote.startts = round(datetime.now().timestamp())
-    while True:
+    if remote.rclone_rcd:
+        remote.rclone = RcloneRC(f'{pbgdir}/data/logs/rclone.log')
+        for server in remote.remote_servers:
+            server.rclone = remote.rclone
+    schedule = remote.schedule
+    while not stop.is_set():
         try:
+            heartbeat_service("pbremote")
             if logfile.exists():
                 if logfile.stat().st_size >= 10485760:
                     logfile.replace(f'{str(logfile)}.old')
-                    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-                    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-            remote.sync_v7_up()
-            remote.sync_multi_up()
-            remote.sync_single_up()
-            remote.check_if_api_synced()
-            remote.alive()
+                    set_logfile(logfile)
+            # Local status changes, only a stat() unless something changed
+            if schedule.due("up"):
+                remote.sync_v7_up()
+                remote.sync_multi_up()
+                remote.sync_single_up()
+                schedule.done("up")
+            if schedule.due("alive"):
+                remote.alive()
+                schedule.done("alive")
             # remote.sync('down', 'cmd')
-            remote.sync_status_down()
-            remote.update_remote_servers()
-            for server in remote.remote_servers:
-                server.load()
-                server.sync_v7_down()
-                server.sync_multi_down()
-                server.sync_single_down()
-                server.sync_api()
+            if schedule.due("status_down"):
+                changed = remote.sync_status_down()
+                schedule.done("status_down", changed)
+                if changed:
+                    schedule.wake("servers")
+                    schedule.wake("api")
+            remote.collect_syncs()
+            if schedule.due("servers"):
+                remote.update_remote_servers()
+                remote.sync_servers()
+                schedule.done("servers")
+            if schedule.due("api"):
+                remote.check_if_api_synced()
+                for server in remote.remote_servers:
+                    server.sync_api()
+                schedule.done("api")
+            stop.wait(max(schedule.wait_time(), 0.5))
         except Exception as e:
             print(f'Something went wrong, but continue {e}')
             traceback.print_exc()
+            stop.wait(5)
+    if remote._executor:
+        remote._executor.shutdown(wait=False, cancel_futures=True)
+    if remote.rclone:
+        remote.rclone.stop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -15,16 +15,608 @@ from time import sleep, mktime
 import glob
 import json
 import hjson
-from io import TextIOWrapper
 from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import platform
-from shutil import copy, copytree, rmtree
+from shutil import copytree, rmtree
+import shutil
+import gzip
+import hashlib
 import os
 import traceback
 import uuid
 from Status import InstanceStatus, InstancesStatus
 from PBCoinData import CoinData
+from pbgui_purefunc import save_json_atomic, git_ref, set_logfile, reset_logfile, supervisor_request, lock_service, heartbeat_service, service_alive, service_pid, forget_service
+from Metrics import Metrics
+from ResourceHistory import ResourceHistory
 import re
+import threading
+from fnmatch import fnmatch
+from time import monotonic
+from contextlib import contextmanager
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class ProcessRegistry():
+    """Scans the process table once and indexes all passivbot processes.
+
+    PBRun invalidates the registry once per loop. The first lookup after that rescans the process table,
+    all further lookups are answered from the index.
+    """
+    def __init__(self):
+        self.v7 = {}
+        self.multi = {}
+        self.single = {}
+        self.valid = False
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.valid = False
+
+    def scan(self):
+        """Index passivbot processes by user (v7 and multi) or by (user, symbol) (single)."""
+        v7 = {}
+        multi = {}
+        single = {}
+        for process in psutil.process_iter(['cmdline']):
+            cmdline = process.info['cmdline']
+            if not cmdline:
+                continue
+            if any("main.py" in sub for sub in cmdline):
+                # cmd: python -u src/main.py <path>/<user>/config.json
+                config = re.split(r'[\\/]', cmdline[-1])
+                if len(config) > 1 and config[-1] == "config.json":
+                    v7[config[-2]] = process
+            elif any("passivbot_multi.py" in sub for sub in cmdline):
+                # cmd: python -u passivbot_multi.py <path>/<user>/multi_run.hjson
+                config = re.split(r'[\\/]', cmdline[-1])
+                if len(config) > 1:
+                    multi[config[-2]] = process
+            elif any("passivbot.py" in sub for sub in cmdline):
+                # cmd: python -u passivbot.py <parameters> <user> <symbol> <config>
+                if len(cmdline) > 3:
+                    single[(cmdline[-3], cmdline[-2])] = process
+        self.v7 = v7
+        self.multi = multi
+        self.single = single
+        self.valid = True
+
+    def refresh(self):
+        with self.lock:
+            if not self.valid:
+                self.scan()
+
+    def find_v7(self, user: str):
+        self.refresh()
+        return self.v7.get(user)
+
+    def find_multi(self, user: str):
+        self.refresh()
+        return self.multi.get(user)
+
+    def find_single(self, user: str, symbol: str):
+        self.refresh()
+        return self.single.get((user, symbol))
+
+class BotProcess():
+    """Tracks the process of a passivbot instance started by PBRun.
+
+    The pid and create_time are saved to passivbot.pid in the instance directory, so liveness can be checked
+    with a single psutil.Process() lookup, even after a restart of PBRun.
+    """
+    def __init__(self, path: str):
+        self.pidfile = Path(f'{path}/passivbot.pid')
+        self.process = None
+
+    def get(self):
+        """Returns the psutil.Process of the bot or None if it is not running."""
+        if self.process:
+            if isinstance(self.process, psutil.Popen):
+                # reap our own child if it has exited
+                self.process.poll()
+            try:
+                if self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE:
+                    return self.process
+            except psutil.NoSuchProcess:
+                pass
+            self.process = None
+            return None
+        if self.pidfile.exists():
+            try:
+                with open(self.pidfile, "r", encoding='utf-8') as f:
+                    pid = json.load(f)
+                process = psutil.Process(pid["pid"])
+                # pid may be reused by another process, compare create_time
+                if abs(process.create_time() - pid["create_time"]) < 0.01 and process.status() != psutil.STATUS_ZOMBIE:
+                    self.process = process
+                    return process
+            except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError, KeyError, TypeError):
+                pass
+        return None
+
+    def save(self, process: psutil.Process):
+        try:
+            pid = {
+                "pid": process.pid,
+                "create_time": process.create_time()
+            }
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        self.process = process
+        with open(self.pidfile, "w", encoding='utf-8') as f:
+            json.dump(pid, f)
+
+    def clear(self):
+        if isinstance(self.process, psutil.Popen):
+            try:
+                self.process.wait(timeout=5)
+            except psutil.TimeoutExpired:
+                pass
+        self.process = None
+        self.pidfile.unlink(missing_ok=True)
+
+class LoopTimer():
+    """Durations of the supervisor loop and its phases as histograms, logged once per log_interval."""
+    BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+    def __init__(self, log_interval: int = 3600):
+        self.phases = {}
+        self.log_interval = log_interval
+        self.log_ts = monotonic()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, monotonic() - start)
+
+    def observe(self, name: str, seconds: float):
+        if name not in self.phases:
+            self.phases[name] = {"counts": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0, "max": 0.0, "last": 0.0}
+        phase = self.phases[name]
+        for index, le in enumerate(self.BUCKETS):
+            if seconds <= le:
+                phase["counts"][index] += 1
+                break
+        phase["sum"] += seconds
+        phase["count"] += 1
+        phase["max"] = max(phase["max"], seconds)
+        phase["last"] = seconds
+
+    def log(self):
+        """Print avg and max of every phase since the last log line."""
+        now = monotonic()
+        if now - self.log_ts < self.log_interval:
+            return
+        self.log_ts = now
+        timing = []
+        for name, phase in self.phases.items():
+            count = phase["count"] - phase.get("logged_count", 0)
+            if count:
+                avg = (phase["sum"] - phase.get("logged_sum", 0)) / count
+                timing.append(f'{name} avg {avg*1000:.1f} ms max {phase["max"]*1000:.1f} ms')
+            phase["logged_count"] = phase["count"]
+            phase["logged_sum"] = phase["sum"]
+            phase["max"] = 0.0
+        if timing:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Loop timing: {", ".join(timing)}')
+
+class LoopSchedule():
+    """Runs the tasks of the supervisor loop on their own cadence. Tasks without interval run every loop."""
+    def __init__(self):
+        self.intervals = {}
+        self.next_run = {}
+
+    def every(self, name: str, seconds: float):
+        self.intervals[name] = seconds
+
+    def due(self, name: str):
+        now = monotonic()
+        if now >= self.next_run.get(name, 0):
+            self.next_run[name] = now + self.intervals.get(name, 0)
+            return True
+        return False
+
+class LogRotate():
+    """Rotates passivbot.log to passivbot.log.1 .. passivbot.log.<generations>.
+
+    A log of a stopped bot is renamed. A running bot keeps its file handle, so its log is copied and truncated,
+    including the lines written during the copy. On Windows a file can not be renamed while the LogTailer of the
+    Monitor has it open, so it is always copied and truncated. Rotated files are gzip compressed in a background thread.
+    """
+    def __init__(self, size: int = 10485760, generations: int = 3, compress: bool = True):
+        self.size = size
+        self.generations = max(generations, 1)
+        self.compress = compress
+        self.rename = os.name != "nt"
+        self.lock = threading.Lock()
+
+    def shift(self, logfile: Path):
+        """Drop the oldest generation and move all others one up."""
+        for generation in range(self.generations, 0, -1):
+            for suffix in ["", ".gz"]:
+                rotated = Path(f'{logfile}.{generation}{suffix}')
+                if not rotated.exists():
+                    continue
+                if generation == self.generations:
+                    rotated.unlink()
+                else:
+                    rotated.replace(f'{logfile}.{generation + 1}{suffix}')
+
+    def copytruncate(self, logfile: Path, rotated: Path):
+        with open(logfile, "rb") as src, open(rotated, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1048576)
+            with open(logfile, "r+b") as log:
+                # catch up with lines written during the copy, then truncate
+                shutil.copyfileobj(src, dst, 1048576)
+                log.truncate(0)
+
+    def gzip(self, rotated: Path):
+        with self.lock:
+            if not rotated.exists():
+                return
+            try:
+                with open(rotated, "rb") as src, gzip.open(f'{rotated}.gz', "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1048576)
+                rotated.unlink()
+            except Exception as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: compress {rotated} {e}')
+
+    def rotate(self, logfile: Path, running: bool):
+        rotated = Path(f'{logfile}.1')
+        with self.lock:
+            self.shift(logfile)
+            if running or not self.rename:
+                self.copytruncate(logfile, rotated)
+            else:
+                logfile.replace(rotated)
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Rotate: {logfile}')
+        if self.compress:
+            threading.Thread(target=self.gzip, args=(rotated,), name="PBRun_LogRotate", daemon=True).start()
+
+
+class RestartBudget():
+    """Crash-loop protection for the restarts done by watch().
+
+    The delay between two restarts doubles with every crash up to backoff_max.
+    More than budget restarts within window seconds quarantine the instance, it is not restarted anymore
+    until its config version changes or PBRun is restarted.
+    """
+    def __init__(self, budget: int = 5, window: int = 3600, backoff_max: int = 600):
+        self.budget = budget
+        self.window = window
+        self.backoff = 5
+        self.backoff_max = backoff_max
+        self.restarts = 0
+        self.crashes = 0
+        self.history = []
+        self.next_start = 0
+        self.quarantined = False
+        # the bot was started or seen running before, only then a start from watch() is a restart
+        self.started = False
+
+    def reset(self):
+        self.crashes = 0
+        self.history = []
+        self.next_start = 0
+        self.quarantined = False
+        self.started = False
+
+    def ready(self):
+        """True if watch() may restart the instance now."""
+        return not self.quarantined and monotonic() >= self.next_start
+
+    def record(self):
+        """Count a restart and schedule the earliest next one.
+
+        Returns:
+            bool: False if the restart budget is exhausted and the instance is quarantined.
+        """
+        now = monotonic()
+        self.history = [ts for ts in self.history if now - ts < self.window]
+        if len(self.history) >= self.budget:
+            self.quarantined = True
+            return False
+        self.history.append(now)
+        self.restarts += 1
+        self.crashes += 1
+        self.next_start = now + min(self.backoff * 2 ** (self.crashes - 1), self.backoff_max)
+        return True
+
+    def stable(self, start_time: float):
+        """Reset the backoff once the bot has been running for backoff_max seconds."""
+        self.started = True
+        if self.crashes and datetime.now().timestamp() - start_time >= self.backoff_max:
+            self.crashes = 0
+
+
+class Admission():
+    """Decides if a bot may be started now.
+
+    A bot needs as much memory as its RSS high-water mark of earlier runs (bot_memory if it never ran).
+    Starts are deferred if they would leave less than memory_reserve available, exceed memory_budget for all bots
+    or if the cpu usage of the system is above cpu_max. Deferred starts are tried again on every loop.
+    """
+    MB = 1048576
+
+    def __init__(self, memory_reserve: int = 100, memory_budget: int = 0, bot_memory: int = 0, cpu_max: float = 0, warmup: int = 300):
+        # sizes in MB, 0 = no limit
+        self.memory_reserve = int(memory_reserve * self.MB)
+        self.memory_budget = int(memory_budget * self.MB)
+        self.bot_memory = int(bot_memory * self.MB)
+        self.cpu_max = cpu_max
+        # bots need some minutes to grow to their peak
+        self.warmup = warmup
+        # path: (rss, peak, start_time) of the running bots
+        self.running = {}
+        # path: (time, need) of admitted bots that are not running yet
+        self.admitted = {}
+
+    def need(self, run):
+        return run.monitor.memory_peak or self.bot_memory
+
+    def update(self, run, running: bool):
+        """Called by PBRun.watch() with the liveness of every bot."""
+        if running:
+            rss = run.monitor.memory.rss if run.monitor.memory else 0
+            self.running[run.path] = (rss, max(self.need(run), rss), run.monitor.start_time)
+            self.admitted.pop(run.path, None)
+        else:
+            self.running.pop(run.path, None)
+
+    def check(self, run):
+        """Returns None if run may start now, otherwise the reason why it is deferred."""
+        need = self.need(run)
+        now = datetime.now().timestamp()
+        self.admitted = {path: admitted for path, admitted in self.admitted.items() if monotonic() - admitted[0] < 60 and path != run.path}
+        # memory the starting and warming up bots will still take
+        growth = sum(need for ts, need in self.admitted.values())
+        growth += sum(max(peak - rss, 0) for rss, peak, start_time in self.running.values() if now - start_time < self.warmup)
+        if need:
+            available = psutil.virtual_memory().available - self.memory_reserve - growth
+            if need > available:
+                return f'memory: needs {need // self.MB} MB'
+        if self.memory_budget:
+            used = sum(peak for path, (rss, peak, start_time) in self.running.items() if path != run.path)
+            used += sum(need for ts, need in self.admitted.values())
+            if used + need > self.memory_budget:
+                return f'memory budget: needs {need // self.MB} MB of {self.memory_budget // self.MB} MB'
+        if self.cpu_max and psutil.cpu_percent() > self.cpu_max:
+            return f'cpu above {self.cpu_max}%'
+        self.admitted[run.path] = (monotonic(), need)
+        return None
+
+# Everything Monitor counts, found with one pass over the line
+LOG_TOKENS = re.compile(r'ERROR|INFO|Traceback|initiating pnl|starting execution loop|done initiating bot|new pnl|balance')
+# "<isoformat> ERROR|INFO ..." lines carry the timestamp
+LOG_TIMESTAMP = re.compile(r'\s*(\d{4}-\d\d-\d\d)T\d\d:\d\d:\d\d\s+(?:ERROR|INFO)(?:\s|$)')
+
+# Monitor attributes saved to monitor.state
+MONITOR_STATE = [
+    "log_watch_ts", "log_yesterday", "log_tb_found", "init_found",
+    "log_error", "log_info", "log_traceback",
+    "errors_today", "errors_yesterday", "infos_today", "infos_yesterday",
+    "tracebacks_today", "tracebacks_yesterday",
+    "pnl_today", "pnl_yesterday", "pnl_counter_today", "pnl_counter_yesterday",
+    "memory_peak"
+]
+
+class LogTailer():
+    """Reads new lines from a logfile that is written by another process.
+
+    The file is kept open between reads. Truncation (size < offset or a new first line) and rotation (new inode)
+    are detected and reading restarts at the beginning of the new file. The first line catches a copytruncate
+    after which the log grew past the old offset before the next read. Every call reads at most chunk_size bytes.
+    """
+    HEAD_SIZE = 256
+
+    def __init__(self, logfile: str, chunk_size: int = 1048576):
+        self.logfile = Path(logfile)
+        self.chunk_size = chunk_size
+        self.file = None
+        self.inode = None
+        self.offset = 0
+        # md5 of the first line of the file
+        self.head = None
+        self.size = 0
+        self.partial = b""
+
+    def close(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+        self.inode = None
+
+    def open(self, offset: int = 0, head: str = None):
+        self.close()
+        self.file = open(self.logfile, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.offset = offset
+        self.head = head
+        self.partial = b""
+        self.file.seek(self.offset)
+
+    def read_head(self, f):
+        """md5 of the first line (at most HEAD_SIZE bytes) of f, None if it is not complete yet."""
+        f.seek(0)
+        data = f.read(self.HEAD_SIZE)
+        end = data.find(b"\n")
+        if end >= 0:
+            data = data[:end + 1]
+        elif len(data) < self.HEAD_SIZE:
+            return None
+        return hashlib.md5(data).hexdigest()
+
+    def file_head(self):
+        """md5 of the first line of the logfile."""
+        try:
+            with open(self.logfile, "rb") as f:
+                return self.read_head(f)
+        except FileNotFoundError:
+            return None
+
+    def behind(self):
+        """Number of bytes written to the logfile but not read yet."""
+        return max(self.size - self.offset, 0)
+
+    def read_lines(self):
+        """Returns the new complete lines since the last call, or None if the logfile does not exist."""
+        try:
+            stat = self.logfile.stat()
+        except FileNotFoundError:
+            self.close()
+            return None
+        if self.file is None:
+            if self.offset <= stat.st_size:
+                self.open(self.offset, self.head)
+            else:
+                self.open(0)
+        elif stat.st_ino != self.inode:
+            # rotated, start with the new file
+            self.open(0)
+        elif stat.st_size < self.offset:
+            # truncated
+            self.open(0)
+        if self.offset:
+            head = self.read_head(self.file)
+            self.file.seek(self.offset)
+            if self.head is None:
+                self.head = head
+            elif head != self.head:
+                # truncated and grown past the offset since the last read
+                self.open(0)
+        self.size = stat.st_size
+        if self.size <= self.offset:
+            return []
+        data = self.file.read(min(self.size - self.offset, self.chunk_size))
+        self.offset += len(data)
+        data = self.partial + data
+        lines = data.split(b"\n")
+        self.partial = lines.pop()
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
+
+# cmd files that wake up PBRun
+COMMAND_PATTERNS = ["activate_*.cmd", "update_status_*.cmd"]
+
+class CommandHandler(FileSystemEventHandler):
+    """watchdog handler, sets the event when an activate or update_status cmd file lands in data/cmd"""
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def on_any_event(self, event):
+        path = getattr(event, "dest_path", "") or event.src_path
+        name = PurePath(str(path)).name
+        if any(fnmatch(name, pattern) for pattern in COMMAND_PATTERNS):
+            self.event.set()
+
+class CommandInbox():
+    """Wakes up PBRun as soon as a new cmd file lands in data/cmd.
+
+    Uses watchdog (inotify) if it is installed. Without watchdog it falls back to polling the cmd files. The directory
+    is only listed if its mtime changed, the daemons write other files to data/cmd all the time.
+    """
+    def __init__(self, cmd_path: str):
+        self.cmd_path = Path(cmd_path)
+        self.event = threading.Event()
+        # Check for cmd files on the first loop
+        self.event.set()
+        self.dir_mtime = None
+        # (name, mtime_ns) of the cmd files found by the last listing and of the ones already reported
+        self.listed = frozenset()
+        self.commands = frozenset()
+        # a handler left cmd files behind, report them again on the next loop
+        self.retry = False
+        self.check_ts = 0
+        self.check_interval = 30
+        self.observer = None
+        if Observer is not None:
+            try:
+                self.observer = Observer()
+                self.observer.schedule(CommandHandler(self.event), str(self.cmd_path), recursive=False)
+                self.observer.daemon = True
+                self.observer.start()
+            except Exception as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: inotify not available, polling {self.cmd_path} {e}')
+                self.observer = None
+
+    def load_dir_mtime(self):
+        try:
+            return self.cmd_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load_commands(self):
+        """(name, mtime_ns) of the cmd files matching COMMAND_PATTERNS."""
+        dir_mtime = self.load_dir_mtime()
+        if dir_mtime != self.dir_mtime:
+            self.dir_mtime = dir_mtime
+            commands = set()
+            try:
+                with os.scandir(self.cmd_path) as entries:
+                    for entry in entries:
+                        if any(fnmatch(entry.name, pattern) for pattern in COMMAND_PATTERNS):
+                            try:
+                                commands.add((entry.name, entry.stat().st_mtime_ns))
+                            except FileNotFoundError:
+                                pass
+            except FileNotFoundError:
+                pass
+            self.listed = frozenset(commands)
+        return self.listed
+
+    def has_new_commands(self):
+        return bool(self.load_commands() - self.commands)
+
+    def rearm(self):
+        """Called by a handler that leaves cmd files for the next loop (still being written or deferred)."""
+        self.retry = True
+
+    def has_commands(self):
+        """Returns True if new cmd files may have arrived since the last call, or if rearm() was called."""
+        if self.retry:
+            self.retry = False
+            return True
+        now = monotonic()
+        if now - self.check_ts > self.check_interval:
+            # Safety net: look for cmd files from time to time, even without a notification
+            self.check_ts = now
+            self.event.clear()
+            if not self.observer:
+                self.commands = self.load_commands()
+            return True
+        if self.observer:
+            if self.event.is_set():
+                self.event.clear()
+                return True
+            return False
+        if self.has_new_commands():
+            self.commands = self.load_commands()
+            return True
+        return False
+
+    def wait(self, timeout: float):
+        """Sleeps up to timeout seconds and returns early if a cmd file arrives."""
+        if self.observer:
+            self.event.wait(timeout)
+            return
+        end = monotonic() + timeout
+        while True:
+            remaining = end - monotonic()
+            if remaining <= 0 or self.has_new_commands():
+                return
+            sleep(min(1, remaining))
+
+    def close(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer = None
 
 class Monitor():
     def __init__(self):
@@ -32,10 +624,22 @@ class Monitor():
         self.user = None
         self.version = None
         self.pb_version = None
-        self.log_lp = None
+        self.log_tailer = None
+        self.log_seek = False
+        self.log_yesterday = True
+        self.log_tb_found = False
         self.start_time = 0
         self.memory = 0
+        # RSS high-water mark of the bot, kept over restarts in monitor.state
+        self.memory_peak = 0
         self.cpu = 0
+        # cpu/rss ring buffer in resources.bin and its hourly summary for data/cmd/history.json
+        self.history = None
+        self.history_summary = None
+        self.history_changed = False
+        self.history_ts = 0
+        self.history_interval = 3600
+        self.sampled_process = None
         self.log_error = None
         self.log_info = None
         self.log_traceback = None
@@ -54,106 +658,185 @@ class Monitor():
         self.pnl_counter_today = 0
         self.pnl_counter_yesterday = 0
         self.init_found = False
+        self.restarts = 0
+        self.quarantined = False
+        self.state_ts = 0
+        self.state_interval = 60
+        # last saved monitor.json
+        self.last_monitor = None
+        self.monitor_ts = 0
+        self.monitor_interval = 60
+        self.changed = False
+        # False if PBRun writes all monitors to data/cmd/monitors.json
+        self.save_file = True
 
     def watch_log(self):
-        yesterday = True
-        logfile = Path(f'{self.path}/passivbot.log')
-        if logfile.exists():
-            seek = False
-            if not self.log_lp:
-                self.log_lp = 0
-                seek = True
-            current_position = logfile.stat().st_size
-            with open(logfile, "r") as f:
-                f.seek(self.log_lp)
-                new_content = f.read().splitlines()
-            self.log_lp = current_position
-            tb_found = False
-            today_ts = int(mktime(date.today().timetuple()))
-            yesterday_ts = today_ts - 86400
-            if self.log_watch_ts != 0 and self.log_watch_ts < today_ts:
-                self.log_error = None
-                self.log_info = None
-                self.log_traceback = None
-                self.errors_yesterday = self.errors_today
-                self.errors_today = 0
-                self.infos_yesterday = self.infos_today
-                self.infos_today = 0
-                self.tracebacks_yesterday = self.tracebacks_today
-                self.tracebacks_today = 0
-                self.pnl_yesterday = self.pnl_today
-                self.pnl_today = 0
-                self.pnl_counter_yesterday = self.pnl_counter_today
-                self.pnl_counter_today = 0
-            for line in new_content:
-                elements = line.split()
-                if len(elements) > 1:
-                    if elements[1] == "ERROR" or elements[1] == "INFO":
-                        # check elements[0] for correct isoformat
-                        if len(elements[0]) == 19:
-                            if elements[0][4] == "-" and elements[0][7] == "-" and elements[0][10] == "T" and elements[0][13] == ":" and elements[0][16] == ":":
-                                ts = int(datetime.fromisoformat(elements[0]).timestamp())
-                                if ts < yesterday_ts:
-                                    continue
-                                else:
-                                    seek = False
-                                if ts < today_ts:
-                                    yesterday = True
-                                else:
-                                    yesterday = False
-                if seek:
+        if not self.log_tailer:
+            self.log_tailer = LogTailer(f'{self.path}/passivbot.log')
+            # Without saved state, skip everything older than yesterday on first read
+            self.log_seek = not self.load_state()
+        new_content = self.log_tailer.read_lines()
+        if new_content is None:
+            return
+        today = date.today()
+        today_ts = int(mktime(today.timetuple()))
+        today_date = today.isoformat()
+        yesterday_date = (today - timedelta(days=1)).isoformat()
+        if self.log_watch_ts != 0 and self.log_watch_ts < today_ts:
+            self.log_tb_found = False
+            self.log_error = None
+            self.log_info = None
+            self.log_traceback = None
+            self.errors_yesterday = self.errors_today
+            self.errors_today = 0
+            self.infos_yesterday = self.infos_today
+            self.infos_today = 0
+            self.tracebacks_yesterday = self.tracebacks_today
+            self.tracebacks_today = 0
+            self.pnl_yesterday = self.pnl_today
+            self.pnl_today = 0
+            self.pnl_counter_yesterday = self.pnl_counter_today
+            self.pnl_counter_today = 0
+        for line in new_content:
+            # ISO date of lines starting with "<isoformat> ERROR|INFO"
+            line_ts = LOG_TIMESTAMP.match(line)
+            if line_ts:
+                line_date = line_ts.group(1)
+                if line_date < yesterday_date:
                     continue
-                if tb_found:
-                    if not "ERROR" in line and not "INFO" in line and not "Traceback" in line:
-                        self.log_traceback.append(line)
-                    else:
-                        tb_found = False
-                        self.tracebacks_today += 1
-                if "ERROR" in line:
-                    if yesterday:
-                        self.errors_yesterday += 1
-                    else:
-                        self.log_error = line
-                        self.errors_today += 1
-                elif "INFO" in line:                 
-                    if yesterday:
-                        self.infos_yesterday += 1
-                    else:
-                        self.log_info = line
-                        self.infos_today += 1
-                    # Skip PNLs after restart bot
-                    if "initiating pnl" in line:
-                        self.init_found = True
-                    if "starting execution loop" in line or "done initiating bot" in line:
-                        self.init_found = False
-                    if self.init_found:
-                        continue
-                    if "new pnl" in line:
-                        if len(elements) == 7:
+                self.log_seek = False
+                self.log_yesterday = line_date < today_date
+            if self.log_seek:
+                continue
+            tokens = LOG_TOKENS.findall(line)
+            if not tokens and not self.log_tb_found:
+                continue
+            yesterday = self.log_yesterday
+            if self.log_tb_found:
+                if not "ERROR" in tokens and not "INFO" in tokens and not "Traceback" in tokens:
+                    self.log_traceback.append(line)
+                else:
+                    self.log_tb_found = False
+                    self.tracebacks_today += 1
+            if "ERROR" in tokens:
+                if yesterday:
+                    self.errors_yesterday += 1
+                else:
+                    self.log_error = line
+                    self.errors_today += 1
+            elif "INFO" in tokens:
+                if yesterday:
+                    self.infos_yesterday += 1
+                else:
+                    self.log_info = line
+                    self.infos_today += 1
+                # Skip PNLs after restart bot
+                if "initiating pnl" in tokens:
+                    self.init_found = True
+                if "starting execution loop" in tokens or "done initiating bot" in tokens:
+                    self.init_found = False
+                if self.init_found:
+                    continue
+                if "new pnl" in tokens:
+                    elements = line.split()
+                    if len(elements) == 7:
+                        if yesterday:
+                            self.pnl_yesterday += float(elements[5])
+                            self.pnl_counter_yesterday += int(elements[2])
+                        else:
+                            self.pnl_today += float(elements[5])
+                            self.pnl_counter_today += int(elements[2])
+                if "balance" in tokens:
+                    elements = line.split()
+                    if len(elements) == 6:
+                        if elements[4] == "->":
                             if yesterday:
-                                self.pnl_yesterday += float(elements[5])
-                                self.pnl_counter_yesterday += int(elements[2])
+                                self.pnl_yesterday += (float(elements[5]) - float(elements[3]))
+                                self.pnl_counter_yesterday += 1
                             else:
-                                self.pnl_today += float(elements[5])
-                                self.pnl_counter_today += int(elements[2])
-                    if "balance" in line:
-                        if len(elements) == 6:
-                            if elements[4] == "->":
-                                if yesterday:
-                                    self.pnl_yesterday += (float(elements[5]) - float(elements[3]))
-                                    self.pnl_counter_yesterday += 1
-                                else:
-                                    self.pnl_today += (float(elements[5]) - float(elements[3]))
-                                    self.pnl_counter_today += 1
-                elif "Traceback" in line:
-                    if yesterday:
-                        self.tracebacks_yesterday += 1
-                    else:
-                        self.log_traceback = []
-                        self.log_traceback.append(line)
-                        tb_found = True
-            self.log_watch_ts = int(datetime.now().timestamp())
-            self.save_monitor()
+                                self.pnl_today += (float(elements[5]) - float(elements[3]))
+                                self.pnl_counter_today += 1
+            elif "Traceback" in tokens:
+                if yesterday:
+                    self.tracebacks_yesterday += 1
+                else:
+                    self.log_traceback = []
+                    self.log_traceback.append(line)
+                    self.log_tb_found = True
+        self.log_watch_ts = int(datetime.now().timestamp())
+        self.save_monitor()
+        if self.log_watch_ts - self.state_ts >= self.state_interval:
+            self.save_state()
+
+    def load_state(self):
+        """Restores log offset and counters from monitor.state, so PBRun does not have to parse the whole log after a restart.
+
+        Returns:
+            bool: True if the state was restored.
+        """
+        state_file = Path(f'{self.path}/monitor.state')
+        if not state_file.exists():
+            return False
+        try:
+            with open(state_file, "r", encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        # Counters older than yesterday are useless
+        yesterday_ts = int(mktime(date.today().timetuple())) - 86400
+        if state.get("log_watch_ts", 0) < yesterday_ts:
+            return False
+        for key in MONITOR_STATE:
+            if key in state:
+                setattr(self, key, state[key])
+        self.log_tailer.offset = 0
+        try:
+            stat = self.log_tailer.logfile.stat()
+            head = self.log_tailer.file_head()
+            # Continue at saved offset if it is still the same logfile, otherwise read the new one from the beginning
+            # (states saved by older versions have no head)
+            if stat.st_ino == state.get("inode") and stat.st_size >= state.get("offset", 0) and state.get("head", head) == head:
+                self.log_tailer.offset = state.get("offset", 0)
+                self.log_tailer.head = head
+        except FileNotFoundError:
+            pass
+        self.state_ts = self.log_watch_ts
+        return True
+
+    def sample_resources(self, process: psutil.Process):
+        """Samples cpu and rss of the running bot into the history.
+
+        cpu_percent() measures since its last call on the same Process, so the first call on a new process is skipped.
+        """
+        try:
+            cpu = process.cpu_percent()
+            self.memory = process.memory_info()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        self.memory_peak = max(self.memory_peak, self.memory.rss)
+        if process is not self.sampled_process:
+            self.sampled_process = process
+            return
+        self.cpu = cpu
+        if not self.history:
+            self.history = ResourceHistory(f'{self.path}/resources.bin')
+        self.history.sample(cpu, self.memory.rss)
+        now = monotonic()
+        if now - self.history_ts >= self.history_interval:
+            self.history_ts = now
+            summary = self.history.summary()
+            if summary != self.history_summary:
+                self.history_summary = summary
+                self.history_changed = True
+
+    def save_state(self):
+        """Checkpoints log offset, inode and counters to monitor.state"""
+        state = {key: getattr(self, key) for key in MONITOR_STATE}
+        state["offset"] = self.log_tailer.offset - len(self.log_tailer.partial)
+        state["inode"] = self.log_tailer.inode
+        state["head"] = self.log_tailer.head
+        save_json_atomic(Path(f'{self.path}/monitor.state'), state)
+        self.state_ts = self.log_watch_ts
 
     def save_monitor(self):
         monitor_file = Path(f'{self.path}/monitor.json')
@@ -177,6 +860,8 @@ class Monitor():
             # py = pnl_yesterday
             # ct = pnl_counter_today
             # cy = pnl_counter_yesterday
+            # r = restarts
+            # q = quarantined
             "u": self.user,
             "p": self.pb_version,
             "v": self.version,
@@ -195,31 +880,83 @@ class Monitor():
             "pt": self.pnl_today,
             "py": self.pnl_yesterday,
             "ct": self.pnl_counter_today,
-            "cy": self.pnl_counter_yesterday
+            "cy": self.pnl_counter_yesterday,
+            "r": self.restarts,
+            "q": self.quarantined
             })
-        with open(monitor_file, "w", encoding='utf-8') as f:
-            json.dump(monitor, f)
+        if monitor == self.last_monitor:
+            return False
+        # memory and cpu change on every loop, only write them once per monitor_interval
+        now = int(datetime.now().timestamp())
+        if self.last_monitor and now - self.monitor_ts < self.monitor_interval:
+            if all(monitor[key] == self.last_monitor[key] for key in monitor if key not in ["m", "c"]):
+                return False
+        self.last_monitor = monitor
+        self.monitor_ts = now
+        self.changed = True
+        if self.save_file:
+            save_json_atomic(monitor_file, monitor)
+        return True
+
+class CoinDataCache():
+    """One CoinData for all DynamicIgnore instances of PBRun.
+
+    The ignored coins are computed once per (exchange, market_cap, vol_mcap) and coindata.json refresh
+    and shared by all instances using the same filter.
+    """
+    def __init__(self):
+        self.coindata = None
+        self.ignored = {}
+        self.check_ts = 0
+        self.check_interval = 60
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Drop the cached lists if PBCoinData saved new data. Checked at most once per check_interval."""
+        now = monotonic()
+        if now - self.check_ts < self.check_interval:
+            return
+        self.check_ts = now
+        if self.coindata.has_new_data():
+            self.ignored = {}
+
+    def ignored_coins(self, exchange: str, market_cap: int, vol_mcap: float):
+        with self.lock:
+            if not self.coindata:
+                self.coindata = CoinData()
+            self.refresh()
+            key = (exchange, market_cap, vol_mcap)
+            if key not in self.ignored:
+                self.coindata.set_filter(exchange, market_cap, vol_mcap)
+                self.ignored[key] = self.coindata.ignored_coins
+            return self.ignored[key]
 
 class DynamicIgnore():
     def __init__(self):
         self.path = None
-        self.coindata = CoinData()
+        self.coin_cache = None
+        self.exchange = None
+        self.market_cap = 0
+        self.vol_mcap = 10.0
         self.ignored_coins = []
     
     def watch(self):
-        if self.coindata.has_new_data():
-            self.coindata.list_symbols()
-        if self.ignored_coins != self.coindata.ignored_coins:
-            removed_coins = set(self.ignored_coins) - set(self.coindata.ignored_coins)
+        if not self.exchange:
+            return False
+        if not self.coin_cache:
+            self.coin_cache = CoinDataCache()
+        ignored_coins = self.coin_cache.ignored_coins(self.exchange, self.market_cap, self.vol_mcap)
+        if self.ignored_coins != ignored_coins:
+            removed_coins = set(self.ignored_coins) - set(ignored_coins)
             removed_coins = [*removed_coins]
             removed_coins.sort()
-            added_coins = set(self.coindata.ignored_coins) - set(self.ignored_coins)
+            added_coins = set(ignored_coins) - set(self.ignored_coins)
             added_coins = [*added_coins]
             added_coins.sort()
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Change ignored_symbols {self.path}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Removed: {removed_coins}')
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Added: {added_coins}')
-            self.ignored_coins = self.coindata.ignored_coins
+            self.ignored_coins = ignored_coins
             self.save()
             if PurePath(self.path).parts[-2] == "multi":
                 self.update_hjson()
@@ -256,11 +993,32 @@ class RunSingle():
         self.pbdir = None
         self.pbvenv = None
         self.pbgdir = None
+        self.processes = None
+        self.bot_process = None
+        self.restarts = None
+        self.log_rotate = None
+        # start tasks waiting for admission
+        self.deferred_tasks = None
     
     def watch(self):
         if not self.is_running():
+            if self.restarts:
+                if self.restarts.started and not self.restart():
+                    return False
+                self.restarts.started = True
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start Single from watch: {self.user} {self.symbol}')
-            self.start()
+            return self.start()
+
+    def restart(self):
+        """Count the restart in the restart budget, False if the instance is quarantined."""
+        allowed = self.restarts.record()
+        self.monitor.restarts = self.restarts.restarts
+        self.monitor.quarantined = self.restarts.quarantined
+        if allowed:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Restart {self.restarts.crashes}: {self.path}')
+        else:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Quarantined: {self.path} crashed {self.restarts.budget} times in {self.restarts.window} seconds')
+        return allowed
 
     def is_running(self):
         if self.pid():
@@ -268,23 +1026,31 @@ class RunSingle():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        if not self.bot_process:
+            self.bot_process = BotProcess(self.path)
+        process = self.bot_process.get()
+        if not process:
+            # Not started by this PBRun, find it in the process table
+            processes = self.processes if self.processes else ProcessRegistry()
+            process = processes.find_single(self.user, self.symbol)
+            if process:
+                self.bot_process.save(process)
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
-                pass
-            if self.user in cmdline and self.symbol in cmdline and any("passivbot.py" in sub for sub in cmdline):
                 self.monitor.start_time = process.create_time()
                 self.monitor.memory = process.memory_info()
-                self.monitor.cpu = process.cpu_percent()
-                return process
+                self.monitor.memory_peak = max(self.monitor.memory_peak, self.monitor.memory.rss)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                return None
+            return process
 
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: {self.user} {self.symbol}')
             self.pid().kill()
+            self.bot_process.clear()
+            if self.processes:
+                self.processes.invalidate()
 
     def start(self):
         if not self.is_running():
@@ -295,28 +1061,40 @@ class RunSingle():
             cmd.extend(shlex.split(cmd_end))
             cmd.extend([config])
             logfile = Path(f'{self.path}/passivbot.log')
+            if self.log_rotate and logfile.exists() and logfile.stat().st_size >= self.log_rotate.size:
+                # bot is stopped, rotate by rename
+                self.log_rotate.rotate(logfile, False)
             log = open(logfile,"ab")
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+            self.bot_process.save(process)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start Single: {cmd_end}')
         # wait until passivbot is running
         for i in range(10):
+            if self.processes:
+                self.processes.invalidate()
             if self.is_running():
                 break
             sleep(1)
+        return self.is_running()
 
     def clean_log(self):
+        if not self.log_rotate:
+            self.log_rotate = LogRotate()
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
-                logfile_old = Path(f'{str(logfile)}.old')
-                copy(logfile,logfile_old)
-                with open(logfile,'r+') as file:
-                    file.truncate()
+            if logfile.stat().st_size >= self.log_rotate.size:
+                tailer = self.monitor.log_tailer
+                if tailer:
+                    # Count the last lines before they move to the rotated file
+                    self.monitor.watch_log()
+                    if logfile.stat().st_size - tailer.offset > tailer.chunk_size:
+                        return
+                self.log_rotate.rotate(logfile, self.is_running())
 
     def create_parameters(self):
         """Create the list of parameters used when running passivbot single instance.
@@ -432,16 +1210,38 @@ class RunMulti():
         self.pbvenv = None
         self.pbgdir = None
         self.dynamic_ignore = None
+        self.coin_cache = None
+        self.processes = None
+        self.bot_process = None
+        self.restarts = None
+        self.log_rotate = None
+        # start tasks waiting for admission
+        self.deferred_tasks = None
     
     def watch(self):
         if not self.is_running():
-            self.start()
+            if self.restarts:
+                if self.restarts.started and not self.restart():
+                    return False
+                self.restarts.started = True
+            return self.start()
+
+    def restart(self):
+        """Count the restart in the restart budget, False if the instance is quarantined."""
+        allowed = self.restarts.record()
+        self.monitor.restarts = self.restarts.restarts
+        self.monitor.quarantined = self.restarts.quarantined
+        if allowed:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Restart {self.restarts.crashes}: {self.path}')
+        else:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Quarantined: {self.path} crashed {self.restarts.budget} times in {self.restarts.window} seconds')
+        return allowed
 
     def watch_dynamic(self):
+        """Returns True if the ignored coins changed and the bot must be restarted (done by PBRun in the worker pool)."""
         if self.dynamic_ignore is not None:
-            if self.dynamic_ignore.watch():
-                self.stop()
-                self.start()
+            return self.dynamic_ignore.watch()
+        return False
 
     def is_running(self):
         if self.pid():
@@ -449,50 +1249,70 @@ class RunMulti():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        if not self.bot_process:
+            self.bot_process = BotProcess(self.path)
+        process = self.bot_process.get()
+        if not process:
+            # Not started by this PBRun, find it in the process table
+            processes = self.processes if self.processes else ProcessRegistry()
+            process = processes.find_multi(self.user)
+            if process:
+                self.bot_process.save(process)
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
-                pass
-            if any(self.user in sub for sub in cmdline) and any("passivbot_multi.py" in sub for sub in cmdline):
                 self.monitor.start_time = process.create_time()
                 self.monitor.memory = process.memory_info()
-                self.monitor.cpu = process.cpu_percent()
-                return process
+                self.monitor.memory_peak = max(self.monitor.memory_peak, self.monitor.memory.rss)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                return None
+            return process
 
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: passivbot_multi.py {self.path}/multi_run.hjson')
             self.pid().kill()
+            self.bot_process.clear()
+            if self.processes:
+                self.processes.invalidate()
 
     def start(self):
         if not self.is_running():
             cmd = [self.pbvenv, '-u', PurePath(f'{self.pbdir}/passivbot_multi.py'), PurePath(f'{self.path}/multi_run.hjson')]
             logfile = Path(f'{self.path}/passivbot.log')
+            if self.log_rotate and logfile.exists() and logfile.stat().st_size >= self.log_rotate.size:
+                # bot is stopped, rotate by rename
+                self.log_rotate.rotate(logfile, False)
             log = open(logfile,"ab")
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
+            self.bot_process.save(process)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: passivbot_multi.py {self.path}/multi_run.hjson')
         # wait until passivbot is running
         for i in range(10):
+            if self.processes:
+                self.processes.invalidate()
             if self.is_running():
                 break
             sleep(1)
+        return self.is_running()
 
     def clean_log(self):
+        if not self.log_rotate:
+            self.log_rotate = LogRotate()
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
-                logfile_old = Path(f'{str(logfile)}.old')
-                copy(logfile,logfile_old)
-                with open(logfile,'r+') as file:
-                    file.truncate()
+            if logfile.stat().st_size >= self.log_rotate.size:
+                tailer = self.monitor.log_tailer
+                if tailer:
+                    # Count the last lines before they move to the rotated file
+                    self.monitor.watch_log()
+                    if logfile.stat().st_size - tailer.offset > tailer.chunk_size:
+                        return
+                self.log_rotate.rotate(logfile, self.is_running())
 
     def create_multi_hjson(self):
         # Write running Version to file
@@ -540,15 +1360,16 @@ class RunMulti():
                             if self._multi_config["dynamic_ignore"]:
                                 self.dynamic_ignore = DynamicIgnore()
                                 self.dynamic_ignore.path = self.path
-                                self.dynamic_ignore.coindata.market_cap = self._multi_config["market_cap"]
-                                self.dynamic_ignore.coindata.vol_mcap = self._multi_config["vol_mcap"]
+                                self.dynamic_ignore.coin_cache = self.coin_cache
+                                self.dynamic_ignore.market_cap = self._multi_config["market_cap"]
+                                self.dynamic_ignore.vol_mcap = self._multi_config["vol_mcap"]
                                 # Find Exchange from User
                                 api_path = f'{self.pbdir}/api-keys.json'
                                 if Path(api_path).exists():
                                     with open(api_path, "r", encoding='utf-8') as f:
                                         api_keys = json.load(f)
                                     if self.user in api_keys:
-                                        self.dynamic_ignore.coindata.exchange = api_keys[self.user]["exchange"]
+                                        self.dynamic_ignore.exchange = api_keys[self.user]["exchange"]
                                         self.dynamic_ignore.watch()
                         return True
                     else:                        
@@ -572,10 +1393,32 @@ class RunV7():
         self.pbvenv = None
         self.pbgdir = None
         self.dynamic_ignore = None
+        self.coin_cache = None
+        self.processes = None
+        self.bot_process = None
+        self.restarts = None
+        self.log_rotate = None
+        # start tasks waiting for admission
+        self.deferred_tasks = None
 
     def watch(self):
         if not self.is_running():
-            self.start()
+            if self.restarts:
+                if self.restarts.started and not self.restart():
+                    return False
+                self.restarts.started = True
+            return self.start()
+
+    def restart(self):
+        """Count the restart in the restart budget, False if the instance is quarantined."""
+        allowed = self.restarts.record()
+        self.monitor.restarts = self.restarts.restarts
+        self.monitor.quarantined = self.restarts.quarantined
+        if allowed:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Restart {self.restarts.crashes}: {self.path}')
+        else:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Quarantined: {self.path} crashed {self.restarts.budget} times in {self.restarts.window} seconds')
+        return allowed
 
     def watch_dynamic(self):
         if self.dynamic_ignore is not None:
@@ -587,55 +1430,73 @@ class RunV7():
         return False
 
     def pid(self):
-        for process in psutil.process_iter():
+        if not self.bot_process:
+            self.bot_process = BotProcess(self.path)
+        process = self.bot_process.get()
+        if not process:
+            # Not started by this PBRun, find it in the process table
+            processes = self.processes if self.processes else ProcessRegistry()
+            process = processes.find_v7(self.user)
+            if process:
+                self.bot_process.save(process)
+        if process:
             try:
-                cmdline = process.cmdline()
-            except psutil.NoSuchProcess:
-                pass
-            except psutil.AccessDenied:
-                pass
-            if any(self.user in sub for sub in cmdline) and any("main.py" in sub for sub in cmdline):
-                if cmdline[-1].endswith(f'{self.user}/config.json') or cmdline[-1].endswith(f'{self.user}\config.json'):
-                    self.monitor.start_time = process.create_time()
-                    self.monitor.memory = process.memory_info()
-                    self.monitor.cpu = process.cpu_percent()
-                    return process
+                self.monitor.start_time = process.create_time()
+                self.monitor.memory = process.memory_info()
+                self.monitor.memory_peak = max(self.monitor.memory_peak, self.monitor.memory.rss)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                return None
+            return process
 
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: passivbot v7 {self.path}/config.json')
             self.pid().kill()
+            self.bot_process.clear()
+            if self.processes:
+                self.processes.invalidate()
 
     def start(self):
         if not self.is_running():
-            old_os_path = os.environ.get('PATH', '')
-            new_os_path = os.path.dirname(self.pbvenv) + os.pathsep + old_os_path
-            os.environ['PATH'] = new_os_path
+            # Starts run in worker threads, so pass PATH to the bot instead of changing os.environ
+            env = os.environ.copy()
+            env['PATH'] = os.path.dirname(self.pbvenv) + os.pathsep + env.get('PATH', '')
             cmd = [self.pbvenv, '-u', PurePath(f'{self.pbdir}/src/main.py'), PurePath(f'{self.path}/config.json')]
             logfile = Path(f'{self.path}/passivbot.log')
+            if self.log_rotate and logfile.exists() and logfile.stat().st_size >= self.log_rotate.size:
+                # bot is stopped, rotate by rename
+                self.log_rotate.rotate(logfile, False)
             log = open(logfile,"ab")
             if platform.system() == "Windows":
                 creationflags = subprocess.DETACHED_PROCESS
                 creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, creationflags=creationflags)
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, env=env, creationflags=creationflags)
             else:
-                subprocess.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, start_new_session=True)
-            os.environ['PATH'] = old_os_path
+                process = psutil.Popen(cmd, stdout=log, stderr=log, cwd=self.pbdir, text=True, env=env, start_new_session=True)
+            self.bot_process.save(process)
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: passivbot_v7 {self.path}/config.json')
         # wait until passivbot is running
         for i in range(10):
+            if self.processes:
+                self.processes.invalidate()
             if self.is_running():
                 break
             sleep(1)
+        return self.is_running()
 
     def clean_log(self):
+        if not self.log_rotate:
+            self.log_rotate = LogRotate()
         logfile = Path(f'{self.path}/passivbot.log')
         if logfile.exists():
-            if logfile.stat().st_size >= 10485760:
-                logfile_old = Path(f'{str(logfile)}.old')
-                copy(logfile,logfile_old)
-                with open(logfile,'r+') as file:
-                    file.truncate()
+            if logfile.stat().st_size >= self.log_rotate.size:
+                tailer = self.monitor.log_tailer
+                if tailer:
+                    # Count the last lines before they move to the rotated file
+                    self.monitor.watch_log()
+                    if logfile.stat().st_size - tailer.offset > tailer.chunk_size:
+                        return
+                self.log_rotate.rotate(logfile, self.is_running())
 
     def create_v7_running_version(self):
         # Write running Version to file
@@ -661,8 +1522,9 @@ class RunV7():
                         if self._v7_config["pbgui"]["dynamic_ignore"]:
                             self.dynamic_ignore = DynamicIgnore()
                             self.dynamic_ignore.path = self.path
-                            self.dynamic_ignore.coindata.market_cap = self._v7_config["pbgui"]["market_cap"]
-                            self.dynamic_ignore.coindata.vol_mcap = self._v7_config["pbgui"]["vol_mcap"]
+                            self.dynamic_ignore.coin_cache = self.coin_cache
+                            self.dynamic_ignore.market_cap = self._v7_config["pbgui"]["market_cap"]
+                            self.dynamic_ignore.vol_mcap = self._v7_config["pbgui"]["vol_mcap"]
                             self._v7_config["live"]["ignored_coins"] = str(PurePath(f'{self.path}/ignored_coins.json'))
                             with open(file, "w", encoding='utf-8') as f:
                                 json.dump(self._v7_config, f, indent=4)
@@ -672,7 +1534,7 @@ class RunV7():
                                 with open(api_path, "r", encoding='utf-8') as f:
                                     api_keys = json.load(f)
                                 if self.user in api_keys:
-                                    self.dynamic_ignore.coindata.exchange = api_keys[self.user]["exchange"]
+                                    self.dynamic_ignore.exchange = api_keys[self.user]["exchange"]
                                     self.dynamic_ignore.watch()
                     return True
                 else:                        
@@ -684,6 +1546,13 @@ class RunV7():
                 self.version = 0
                 traceback.print_exc()
 
+# Version probes of PBRun: ttl in seconds and the attributes they set
+VERSION_PROBES = {
+    "local": (300, ["pbgui_version", "pb6_version", "pb7_version", "pbgui_commit", "pb6_commit", "pb7_commit", "reboot"]),
+    "upgrades": (21600, ["upgrades"]),
+    "origin": (3600, ["pbgui_version_origin", "pb6_version_origin", "pb7_version_origin", "pbgui_commit_origin", "pb6_commit_origin", "pb7_commit_origin"]),
+}
+
 class PBRun():
     """PBRun links together PBRemote, PBGui and Passivbot, while being independant and can maintain passivbot working by itself.
 
@@ -705,11 +1574,25 @@ class PBRun():
         self.pb7_commit_origin = "N/A"
         self.upgrades = 0
         self.reboot = False
+        # Cached results of the version probes, shared by PBRemote and the GUI
+        self.versions_cache = Path(f'{Path.cwd()}/data/cache/versions.json')
+        self.versions_cache_mtime = 0
+        self.probe_ts = {}
+        self.probe_thread = None
         self.run_multi = []
         self.run_single = []
         self.run_v7 = []
         self.index = 0
         self.pbgdir = Path.cwd()
+        self.processes = ProcessRegistry()
+        # Shared coin data for dynamic_ignore
+        self.coin_cache = CoinDataCache()
+        # Worker pool for starting and stopping bots
+        self._executor = None
+        self.pending = {}
+        # path: (run, tasks) submitted while the instance had a pending job, run when it is done
+        self.queued = {}
+        self.pending_lock = threading.Lock()
         pb_config = configparser.ConfigParser()
         pb_config.read('pbgui.ini')
         # Init activate_ts and pbname
@@ -725,6 +1608,61 @@ class PBRun():
             self.activate_single_ts = int(pb_config.get("main", "activate_single_ts"))
         else:
             self.activate_single_ts = 0
+        self.start_workers = 4
+        if pb_config.has_option("pbrun", "start_workers"):
+            self.start_workers = int(pb_config.get("pbrun", "start_workers"))
+        # Crash-loop protection: restart_budget restarts in restart_window seconds, backoff up to restart_backoff_max
+        self.restart_budget = 5
+        if pb_config.has_option("pbrun", "restart_budget"):
+            self.restart_budget = int(pb_config.get("pbrun", "restart_budget"))
+        self.restart_window = 3600
+        if pb_config.has_option("pbrun", "restart_window"):
+            self.restart_window = int(pb_config.get("pbrun", "restart_window"))
+        self.restart_backoff_max = 600
+        if pb_config.has_option("pbrun", "restart_backoff_max"):
+            self.restart_backoff_max = int(pb_config.get("pbrun", "restart_backoff_max"))
+        # Admission control: memory_reserve/memory_budget/bot_memory in MB, cpu_max in percent, 0 = off
+        admission = {"memory_reserve": 100, "memory_budget": 0, "bot_memory": 0, "cpu_max": 0}
+        for option in admission:
+            if pb_config.has_option("pbrun", option):
+                admission[option] = float(pb_config.get("pbrun", option))
+        self.admission = Admission(**admission)
+        # Prometheus metrics: HTTP endpoint on metrics_host:metrics_port (0 = off) and/or textfile metrics_file
+        self.metrics = None
+        self.metrics_port = 0
+        if pb_config.has_option("pbrun", "metrics_port"):
+            self.metrics_port = int(pb_config.get("pbrun", "metrics_port"))
+        self.metrics_host = "127.0.0.1"
+        if pb_config.has_option("pbrun", "metrics_host"):
+            self.metrics_host = pb_config.get("pbrun", "metrics_host")
+        self.metrics_file = None
+        if pb_config.has_option("pbrun", "metrics_file"):
+            self.metrics_file = pb_config.get("pbrun", "metrics_file") or None
+        # Supervisor loop: tick seconds between loops, slower tasks run every <task>_interval seconds
+        self.tick = 5
+        if pb_config.has_option("pbrun", "tick"):
+            self.tick = float(pb_config.get("pbrun", "tick"))
+        self.schedule = LoopSchedule()
+        for task, interval in [("logs", 10), ("dynamic", 60), ("clean_log", 10), ("resources", 10)]:
+            if pb_config.has_option("pbrun", f'{task}_interval'):
+                interval = float(pb_config.get("pbrun", f'{task}_interval'))
+            self.schedule.every(task, interval)
+        self.timer = LoopTimer()
+        # Rotation of passivbot.log
+        log_size = 10485760
+        if pb_config.has_option("pbrun", "log_size"):
+            log_size = int(pb_config.get("pbrun", "log_size"))
+        log_generations = 3
+        if pb_config.has_option("pbrun", "log_generations"):
+            log_generations = int(pb_config.get("pbrun", "log_generations"))
+        log_compress = True
+        if pb_config.has_option("pbrun", "log_compress"):
+            log_compress = pb_config.getboolean("pbrun", "log_compress")
+        self.log_rotate = LogRotate(log_size, log_generations, log_compress)
+        # Write all monitors to one data/cmd/monitors.json instead of one monitor.json per instance
+        self.monitors_file = False
+        if pb_config.has_option("pbrun", "monitors_file"):
+            self.monitors_file = pb_config.getboolean("pbrun", "monitors_file")
         if pb_config.has_option("main", "activate_v7_ts"):
             self.activate_v7_ts = int(pb_config.get("main", "activate_v7_ts"))
         else:
@@ -747,8 +1685,7 @@ class PBRun():
             self.pb7dir = pb_config.get("main", "pb7dir")
         if not any([self.pbdir, self.pb7dir]):
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: No passivbot directory configured in pbgui.ini')
                 exit(1)
             else:
@@ -768,8 +1705,7 @@ class PBRun():
             self.pb7venv = pb_config.get("main", "pb7venv")
         if not any([self.pbvenv, self.pb7venv]):
             if __name__ == '__main__':
-                sys.stdout = sys.__stdout__
-                sys.stderr = sys.__stderr__
+                reset_logfile()
                 print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: No passivbot venv python interpreter configured in pbgui.ini')
                 exit(1)
             else:
@@ -787,6 +1723,7 @@ class PBRun():
         self.cmd_path = f'{self.pbgdir}/data/cmd'
         if not Path(self.cmd_path).exists():
             Path(self.cmd_path).mkdir(parents=True)            
+        self._inbox = None
         # Init pid
         self.piddir = Path(f'{self.pbgdir}/data/pid')
         if not self.piddir.exists():
@@ -794,13 +1731,214 @@ class PBRun():
         self.pidfile = Path(f'{self.piddir}/pbrun.pid')
         self.my_pid = None
 
+    @property
+    def inbox(self):
+        """CommandInbox for data/cmd, only started when used by the PBRun daemon."""
+        if not self._inbox:
+            self._inbox = CommandInbox(self.cmd_path)
+        return self._inbox
+
+    @property
+    def executor(self):
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(max_workers=self.start_workers, thread_name_prefix="PBRun")
+        return self._executor
+
+    def is_pending(self, run):
+        """True if a start or stop of the instance is queued or running in the worker pool."""
+        with self.pending_lock:
+            return run.path in self.pending
+
+    def submit(self, run, *tasks):
+        """Runs tasks (start, stop, ...) of one instance one after another in the worker pool.
+
+        The supervisor loop does not wait for them. Only one job per instance runs at a time. Tasks submitted
+        while the instance has a pending job are run after it, newer tasks replace older queued ones.
+
+        Returns:
+            bool: False if the tasks were queued behind a pending job.
+        """
+        with self.pending_lock:
+            if run.path in self.pending:
+                self.queued[run.path] = (run, tasks)
+                return False
+            future = self.executor.submit(self.run_tasks, tasks)
+            self.pending[run.path] = future
+        future.add_done_callback(lambda future: self.task_done(run, future))
+        return True
+
+    def run_tasks(self, tasks):
+        result = None
+        for task in tasks:
+            result = task()
+        return result
+
+    def task_done(self, run, future):
+        """Readiness callback of a worker job."""
+        with self.pending_lock:
+            self.pending.pop(run.path, None)
+            queued = self.queued.pop(run.path, None)
+        error = future.exception()
+        if error:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: {run.path} {error}')
+            traceback.print_exception(type(error), error, error.__traceback__)
+        elif future.result() is False and not self.start_skipped(run):
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: {run.path} not running after start')
+        if queued:
+            queued_run, tasks = queued
+            try:
+                self.submit(queued_run, *tasks)
+            except RuntimeError:
+                # worker pool is shut down
+                pass
+
+    def start_skipped(self, run):
+        """True if the bot was not started on purpose, because it is quarantined or its start is deferred."""
+        if run.monitor.quarantined:
+            return True
+        status = self.status_of(run).find_name(PurePath(run.path).name)
+        return status is not None and bool(status.deferred)
+
+    def watch(self, run):
+        """Restarts the instance in the worker pool if it is not running and the restart budget allows it."""
+        if self.is_pending(run):
+            return
+        if run.is_running():
+            run.restarts.stable(run.monitor.start_time)
+            self.admission.update(run, True)
+        else:
+            self.admission.update(run, False)
+            if run.restarts.ready() and self.admit(run):
+                if run.deferred_tasks:
+                    # first start of the instance was deferred
+                    tasks = run.deferred_tasks
+                    run.deferred_tasks = None
+                    self.submit(run, *tasks)
+                else:
+                    self.submit(run, run.watch)
+
+    def status_of(self, run):
+        if isinstance(run, RunV7):
+            return self.instances_status_v7
+        if isinstance(run, RunMulti):
+            return self.instances_status
+        return self.instances_status_single
+
+    def admit(self, run, status: InstanceStatus = None):
+        """True if run may start now. Otherwise the reason is set as deferred in its status, so the master can see it.
+
+        Args:
+            status (InstanceStatus): status that is saved by the caller, else the status of run is updated and saved.
+        """
+        reason = self.admission.check(run)
+        instances_status = None
+        if status is None:
+            instances_status = self.status_of(run)
+            status = instances_status.find_name(PurePath(run.path).name)
+        if status is None or status.deferred == reason:
+            return reason is None
+        if reason:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Defer start of {run.path}: {reason}')
+        else:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Admit start of {run.path}')
+        status.deferred = reason
+        if instances_status:
+            instances_status.save()
+        return reason is None
+
+    def load_versions_cache(self):
+        if not self.versions_cache.exists():
+            return
+        mtime = self.versions_cache.stat().st_mtime
+        if mtime == self.versions_cache_mtime:
+            return
+        try:
+            with open(self.versions_cache, "r", encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self.versions_cache_mtime = mtime
+        # ignore a partial or hand-edited cache
+        if not isinstance(cache, dict):
+            return
+        ts = cache.get("ts", {})
+        values = cache.get("values", {})
+        if not isinstance(ts, dict) or not isinstance(values, dict):
+            return
+        for probe, (ttl, attributes) in VERSION_PROBES.items():
+            probe_ts = ts.get(probe, 0)
+            if isinstance(probe_ts, (int, float)) and probe_ts > self.probe_ts.get(probe, 0):
+                self.probe_ts[probe] = probe_ts
+                for attribute in attributes:
+                    if attribute in values:
+                        setattr(self, attribute, values[attribute])
+
+    def save_versions_cache(self):
+        values = {}
+        for probe, (ttl, attributes) in VERSION_PROBES.items():
+            for attribute in attributes:
+                values[attribute] = getattr(self, attribute)
+        self.versions_cache.parent.mkdir(parents=True, exist_ok=True)
+        save_json_atomic(self.versions_cache, {"ts": self.probe_ts, "values": values})
+        self.versions_cache_mtime = self.versions_cache.stat().st_mtime
+
+    def probe_versions(self, origin: bool = False, force: bool = False):
+        """Load the cached versions and refresh expired ones in a background thread. Never blocks.
+
+        Args:
+            origin (bool): Also probe the git origins (git fetch).
+            force (bool): Ignore the ttl of the cache.
+        """
+        self.load_versions_cache()
+        if self.probe_thread and self.probe_thread.is_alive():
+            return
+        now = datetime.now().timestamp()
+        probes = []
+        for probe, (ttl, attributes) in VERSION_PROBES.items():
+            if probe == "origin" and not origin:
+                continue
+            if force or now - self.probe_ts.get(probe, 0) >= ttl:
+                probes.append(probe)
+        if probes:
+            self.probe_thread = threading.Thread(target=self.run_probes, args=(probes,), name="PBRun_VersionProbe", daemon=True)
+            self.probe_thread.start()
+
+    def run_probes(self, probes: list):
+        try:
+            for probe in probes:
+                if probe == "local":
+                    self.load_versions()
+                    self.load_git_commits()
+                    self.has_reboot()
+                elif probe == "upgrades":
+                    self.has_upgrades()
+                elif probe == "origin":
+                    self.load_git_origin()
+                    self.load_versions_origin()
+                self.probe_ts[probe] = datetime.now().timestamp()
+            self.save_versions_cache()
+        except Exception as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: version probe {e}')
+            traceback.print_exc()
+
+    def git_commit(self, git_dir: Path, ref: str = "HEAD"):
+        """Commit hash of ref read from the git files, falls back to git log"""
+        commit = git_ref(git_dir, ref)
+        if commit:
+            return commit
+        rev = ref.replace("refs/remotes/", "") if ref != "HEAD" else None
+        cmd = ["git", "--git-dir", f'{git_dir}', "log", "-n", "1", "--pretty=format:%H"]
+        if rev:
+            cmd.append(rev)
+        return subprocess.run(cmd, stdout=subprocess.PIPE, text=True).stdout
+
     def has_upgrades(self):
         """Check if apt-get dist-upgrade -s finds upgrades available"""
         my_env = os.environ.copy()
         my_env["LANG"] = 'C'
         try:
             apt_upgrade = subprocess.run(["apt-get", "dist-upgrade", "-s"], stdout=subprocess.PIPE, text=True, env=my_env)
-        except Exception as e:
+        except Exception:
             self.upgrades = "N/A"
             return
         match = re.search(r"(\d+) upgraded", apt_upgrade.stdout)
@@ -809,8 +1947,7 @@ class PBRun():
 
     def has_reboot(self):
         """Check if /var/run/reboot-required exists"""
-        if Path("/var/run/reboot-required").exists():
-            self.reboot = True
+        self.reboot = Path("/var/run/reboot-required").exists()
 
     def load_git_origin(self):
         """git fetch origin and load last commit from origin/master"""
@@ -818,42 +1955,36 @@ class PBRun():
         if pbgui_git.exists():
             pbgui_git = Path(f'{self.pbgdir}/.git')
             subprocess.run(["git", "--git-dir", f'{pbgui_git}', "fetch", "origin"])
-            pbgui_commit = subprocess.run(["git", "--git-dir", f'{pbgui_git}', "log", "-n", "1", "--pretty=format:%H", "origin/main"], stdout=subprocess.PIPE, text=True)
-            self.pbgui_commit_origin = pbgui_commit.stdout
+            self.pbgui_commit_origin = self.git_commit(pbgui_git, "refs/remotes/origin/main")
         if self.pbdir:
             pb6_git = Path(f'{self.pbdir}/.git')
             if pb6_git.exists():
                 pb6_git = Path(f'{self.pbdir}/.git')
                 subprocess.run(["git", "--git-dir", f'{pb6_git}', "fetch", "origin"])
-                pb6_commit = subprocess.run(["git", "--git-dir", f'{pb6_git}', "log", "-n", "1", "--pretty=format:%H", "origin/v6.1.4b_latest_v6"], stdout=subprocess.PIPE, text=True)
-                self.pb6_commit_origin = pb6_commit.stdout
+                self.pb6_commit_origin = self.git_commit(pb6_git, "refs/remotes/origin/v6.1.4b_latest_v6")
         if self.pb7dir:
             pb7_git = Path(f'{self.pb7dir}/.git')
             if pb7_git.exists():
                 pb7_git = Path(f'{self.pb7dir}/.git')
                 subprocess.run(["git", "--git-dir", f'{pb7_git}', "fetch", "origin"])
-                pb7_commit = subprocess.run(["git", "--git-dir", f'{pb7_git}', "log", "-n", "1", "--pretty=format:%H", "origin/master"], stdout=subprocess.PIPE, text=True)
-                self.pb7_commit_origin = pb7_commit.stdout
+                self.pb7_commit_origin = self.git_commit(pb7_git, "refs/remotes/origin/master")
 
     def load_git_commits(self):
-        """Load the git commit hash of pbgui, pb6 and pb7 using git log -n 1"""
+        """Load the git commit hash of pbgui, pb6 and pb7 from .git/HEAD"""
         pbgui_git = Path(f'{self.pbgdir}/.git')
         if pbgui_git.exists():
             pbgui_git = Path(f'{self.pbgdir}/.git')
-            pbgui_commit = subprocess.run(["git", "--git-dir", f'{pbgui_git}', "log", "-n", "1", "--pretty=format:%H"], stdout=subprocess.PIPE, text=True)
-            self.pbgui_commit = pbgui_commit.stdout
+            self.pbgui_commit = self.git_commit(pbgui_git)
         if self.pbdir:
             pb6_git = Path(f'{self.pbdir}/.git')
             if pb6_git.exists():
                 pb6_git = Path(f'{self.pbdir}/.git')
-                pb6_commit = subprocess.run(["git", "--git-dir", f'{pb6_git}', "log", "-n", "1", "--pretty=format:%H"], stdout=subprocess.PIPE, text=True)
-                self.pb6_commit = pb6_commit.stdout
+                self.pb6_commit = self.git_commit(pb6_git)
         if self.pb7dir:
             pb7_git = Path(f'{self.pb7dir}/.git')
             if pb7_git.exists():
                 pb7_git = Path(f'{self.pb7dir}/.git')
-                pb7_commit = subprocess.run(["git", "--git-dir", f'{pb7_git}', "log", "-n", "1", "--pretty=format:%H"], stdout=subprocess.PIPE, text=True)
-                self.pb7_commit = pb7_commit.stdout
+                self.pb7_commit = self.git_commit(pb7_git)
 
     def load_versions_origin(self):
         """git show origin:README.md and load the versions of pbgui, pb6 and pb7"""
@@ -927,7 +2058,12 @@ class PBRun():
         if run_v7:
             for v7 in self.run_v7:
                 if v7.path == run_v7.path:
+                    if v7.version != run_v7.version:
+                        # New config, give it a new restart budget
+                        v7.restarts.reset()
+                        v7.monitor.quarantined = False
                     v7.version = run_v7.version
+                    v7.deferred_tasks = run_v7.deferred_tasks
                     return
             self.run_v7.append(run_v7)
     
@@ -942,7 +2078,12 @@ class PBRun():
         if run_multi:
             for multi in self.run_multi:
                 if multi.path == run_multi.path:
+                    if multi.version != run_multi.version:
+                        # New config, give it a new restart budget
+                        multi.restarts.reset()
+                        multi.monitor.quarantined = False
                     multi.version = run_multi.version
+                    multi.deferred_tasks = run_multi.deferred_tasks
                     return
             self.run_multi.append(run_multi)
 
@@ -957,7 +2098,12 @@ class PBRun():
         if run_single:
             for single in self.run_single:
                 if single.path == run_single.path:
+                    if single.version != run_single.version:
+                        # New config, give it a new restart budget
+                        single.restarts.reset()
+                        single.monitor.quarantined = False
                     single.version = run_single.version
+                    single.deferred_tasks = run_single.deferred_tasks
                     return
             self.run_single.append(run_single)
 
@@ -986,6 +2132,11 @@ class PBRun():
         with open(cfile, "w", encoding='utf-8') as f:
             json.dump(cfg, f)
 
+    def rearm_inbox(self):
+        """cmd files are left for the next loop, make sure it looks for them."""
+        if self._inbox:
+            self._inbox.rearm()
+
     def has_update_status(self):
         """Checks for new status, and update the status files accordingly.
         
@@ -993,20 +2144,29 @@ class PBRun():
         """
         p = str(Path(f'{self.cmd_path}/update_status_*.cmd'))
         status_files = glob.glob(p)
-        for cfile in status_files:
-            cfile = Path(cfile)
-            if cfile.exists():
-                with open(cfile, "r", encoding='utf-8') as f:
-                    cfg = json.load(f)
-                    rserver = cfg["rserver"]
-                    status_file = cfg["status_file"]
-                    if status_file.split('/')[-1] == 'status.json':
-                        self.update_from_status(status_file, rserver)
-                    elif status_file.split('/')[-1] == 'status_single.json':
-                        self.update_from_status_single(status_file, rserver)
-                    elif status_file.split('/')[-1] == 'status_v7.json':
-                        self.update_from_status_v7(status_file, rserver)
-                cfile.unlink(missing_ok=True)
+        if not status_files:
+            return
+        # Write each status file only once for all updates
+        with self.instances_status.batch(), self.instances_status_single.batch(), self.instances_status_v7.batch():
+            for cfile in status_files:
+                cfile = Path(cfile)
+                if cfile.exists():
+                    with open(cfile, "r", encoding='utf-8') as f:
+                        try:
+                            cfg = json.load(f)
+                        except json.JSONDecodeError:
+                            # cmd file is still being written, try again on next loop
+                            self.rearm_inbox()
+                            continue
+                        rserver = cfg["rserver"]
+                        status_file = cfg["status_file"]
+                        if status_file.split('/')[-1] == 'status.json':
+                            self.update_from_status(status_file, rserver)
+                        elif status_file.split('/')[-1] == 'status_single.json':
+                            self.update_from_status_single(status_file, rserver)
+                        elif status_file.split('/')[-1] == 'status_v7.json':
+                            self.update_from_status_v7(status_file, rserver)
+                    cfile.unlink(missing_ok=True)
 
     def update_from_status_v7(self, status_file : str, rserver : str):
         """Updates the v7 status based on the provided status file.
@@ -1224,11 +2384,33 @@ class PBRun():
         """
         p = str(Path(f'{self.cmd_path}/activate_*.cmd'))
         activates = glob.glob(p)
-        for cfile in activates:
+        if not activates:
+            return
+        # The GUI writes one cmd file per instance. While it is still writing (newest file younger than 1s),
+        # leave them for the next loop, so all of them are applied together without blocking the loop.
+        now = datetime.now().timestamp()
+        try:
+            if now - max(Path(cfile).stat().st_mtime for cfile in activates) < 1:
+                self.rearm_inbox()
+                return
+        except FileNotFoundError:
+            self.rearm_inbox()
+            return
+        # Drain all pending cmd files and apply them together: one ini write and one status save per type
+        v7_instances = []
+        multi_instances = []
+        single_instances = []
+        done = []
+        for cfile in sorted(activates):
             cfile = Path(cfile)
             if cfile.exists():
                 with open(cfile, "r", encoding='utf-8') as f:
-                    cfg = json.load(f)
+                    try:
+                        cfg = json.load(f)
+                    except json.JSONDecodeError:
+                        # cmd file is still being written, try again on next loop
+                        self.rearm_inbox()
+                        continue
                     instance = cfg["instance"]
                     multi = cfg["multi"]
                     if "version" in cfg:
@@ -1236,40 +2418,49 @@ class PBRun():
                     else:
                         version = None
                     if version == "7":
-                        self.update_activate_v7()
-                        self.watch_v7([f'{self.v7_path}/{instance}'])
+                        path = f'{self.v7_path}/{instance}'
+                        if path not in v7_instances:
+                            v7_instances.append(path)
                     elif multi:
-                        self.update_activate()
-                        self.watch_multi([f'{self.multi_path}/{instance}'])
+                        path = f'{self.multi_path}/{instance}'
+                        if path not in multi_instances:
+                            multi_instances.append(path)
                     else:
-                        self.update_activate_single()
-                        self.watch_single([f'{self.single_path}/{instance}'])
-                cfile.unlink(missing_ok=True)
-    
-    def update_activate_v7(self):
-        self.activate_v7_ts = int(datetime.now().timestamp())
-        self.instances_status_v7.activate_ts = self.activate_v7_ts
-        pb_config = configparser.ConfigParser()
-        pb_config.read('pbgui.ini')
-        pb_config.set("main", "activate_v7_ts", str(self.activate_v7_ts))
-        with open('pbgui.ini', 'w') as pbgui_configfile:
-            pb_config.write(pbgui_configfile)
-
-    def update_activate(self):
-        self.activate_ts = int(datetime.now().timestamp())
-        self.instances_status.activate_ts = self.activate_ts
-        pb_config = configparser.ConfigParser()
-        pb_config.read('pbgui.ini')
-        pb_config.set("main", "activate_ts", str(self.activate_ts))
-        with open('pbgui.ini', 'w') as pbgui_configfile:
-            pb_config.write(pbgui_configfile)
-
-    def update_activate_single(self):
-        self.activate_single_ts = int(datetime.now().timestamp())
-        self.instances_status_single.activate_ts = self.activate_single_ts
+                        path = f'{self.single_path}/{instance}'
+                        if path not in single_instances:
+                            single_instances.append(path)
+                done.append(cfile)
+        if not done:
+            return
+        self.update_activates(v7=bool(v7_instances), multi=bool(multi_instances), single=bool(single_instances))
+        if v7_instances:
+            self.watch_v7(v7_instances)
+        if multi_instances:
+            self.watch_multi(multi_instances)
+        if single_instances:
+            self.watch_single(single_instances)
+        for cfile in done:
+            cfile.unlink(missing_ok=True)
+        if len(done) > 1:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Activated {len(done)} instances')
+
+    def update_activates(self, v7: bool = False, multi: bool = False, single: bool = False):
+        """Set the activate timestamps of the given types and write them to pbgui.ini in one go."""
+        now = int(datetime.now().timestamp())
         pb_config = configparser.ConfigParser()
         pb_config.read('pbgui.ini')
-        pb_config.set("main", "activate_single_ts", str(self.activate_single_ts))
+        if v7:
+            self.activate_v7_ts = now
+            self.instances_status_v7.activate_ts = now
+            pb_config.set("main", "activate_v7_ts", str(now))
+        if multi:
+            self.activate_ts = now
+            self.instances_status.activate_ts = now
+            pb_config.set("main", "activate_ts", str(now))
+        if single:
+            self.activate_single_ts = now
+            self.instances_status_single.activate_ts = now
+            pb_config.set("main", "activate_single_ts", str(now))
         with open('pbgui.ini', 'w') as pbgui_configfile:
             pb_config.write(pbgui_configfile)
 
@@ -1296,22 +2487,27 @@ class PBRun():
                 run_v7.pbdir = self.pb7dir
                 run_v7.pbvenv = self.pb7venv
                 run_v7.pbgdir = self.pbgdir
+                run_v7.processes = self.processes
+                run_v7.log_rotate = self.log_rotate
+                run_v7.coin_cache = self.coin_cache
+                run_v7.restarts = RestartBudget(self.restart_budget, self.restart_window, self.restart_backoff_max)
+                run_v7.monitor.save_file = not self.monitors_file
                 if run_v7.load():
                     if run_v7.is_running():
                         running_version = self.find_running_version(v7_instance)
                         if running_version < run_v7.version:
-                            run_v7.stop()
-                            run_v7.create_v7_running_version()
-                            run_v7.start()
+                            self.submit(run_v7, run_v7.stop, run_v7.create_v7_running_version, run_v7.start)
+                    elif self.admit(run_v7, status):
+                        self.submit(run_v7, run_v7.create_v7_running_version, run_v7.start)
                     else:
-                        run_v7.create_v7_running_version()
-                        run_v7.start()
+                        # started by watch() as soon as there are enough resources
+                        run_v7.deferred_tasks = (run_v7.create_v7_running_version, run_v7.start)
                     self.add_v7(run_v7)
                     status.running = True
                 else:
                     self.remove_v7(run_v7)
                     status.running = False
-                    run_v7.stop()
+                    self.submit(run_v7, run_v7.stop)
                 status.version = run_v7.version
                 status.enabled_on = run_v7.name
                 self.instances_status_v7.add(status)
@@ -1343,22 +2539,26 @@ class PBRun():
                 run_single.pbdir = self.pbdir
                 run_single.pbvenv = self.pbvenv
                 run_single.pbgdir = self.pbgdir
+                run_single.processes = self.processes
+                run_single.log_rotate = self.log_rotate
+                run_single.restarts = RestartBudget(self.restart_budget, self.restart_window, self.restart_backoff_max)
+                run_single.monitor.save_file = not self.monitors_file
                 if run_single.load():
                     if run_single.is_running():
                         running_version = self.find_running_version(single_instance)
                         if running_version < run_single.version:
-                            run_single.stop()
-                            # run_single.create_parameters()
-                            run_single.start()
+                            self.submit(run_single, run_single.stop, run_single.start)
+                    elif self.admit(run_single, status):
+                        self.submit(run_single, run_single.start)
                     else:
-                        # run_single.create_parameters()
-                        run_single.start()
+                        # started by watch() as soon as there are enough resources
+                        run_single.deferred_tasks = (run_single.start,)
                     self.add_single(run_single)
                     status.running = True
                 else:
                     self.remove_single(run_single)
                     status.running = False
-                    run_single.stop()
+                    self.submit(run_single, run_single.stop)
                 status.name = single_instance.split('/')[-1]
                 status.multi = run_single.multi
                 status.version = run_single.version
@@ -1393,22 +2593,27 @@ class PBRun():
                 run_multi.pbdir = self.pbdir
                 run_multi.pbvenv = self.pbvenv
                 run_multi.pbgdir = self.pbgdir
+                run_multi.processes = self.processes
+                run_multi.log_rotate = self.log_rotate
+                run_multi.coin_cache = self.coin_cache
+                run_multi.restarts = RestartBudget(self.restart_budget, self.restart_window, self.restart_backoff_max)
+                run_multi.monitor.save_file = not self.monitors_file
                 if run_multi.load():
                     if run_multi.is_running():
                         running_version = self.find_running_version(multi_instance)
                         if running_version < run_multi.version:
-                            run_multi.stop()
-                            run_multi.create_multi_hjson()
-                            run_multi.start()
+                            self.submit(run_multi, run_multi.stop, run_multi.create_multi_hjson, run_multi.start)
+                    elif self.admit(run_multi, status):
+                        self.submit(run_multi, run_multi.create_multi_hjson, run_multi.start)
                     else:
-                        run_multi.create_multi_hjson()
-                        run_multi.start()
+                        # started by watch() as soon as there are enough resources
+                        run_multi.deferred_tasks = (run_multi.create_multi_hjson, run_multi.start)
                     self.add_multi(run_multi)
                     status.running = True
                 else:
                     self.remove_multi(run_multi)
                     status.running = False
-                    run_multi.stop()
+                    self.submit(run_multi, run_multi.stop)
                 status.version = run_multi.version
                 status.enabled_on = run_multi.name
                 self.instances_status.add(status)
@@ -1419,16 +2624,107 @@ class PBRun():
                 self.instances_status.remove(instance)
         self.instances_status.save()
 
+    def save_monitors(self):
+        """Writes the monitors of all instances to data/cmd/monitors.json if one of them has changed."""
+        changed = False
+        monitors = {}
+        for run in self.run_v7 + self.run_multi + self.run_single:
+            if run.monitor.last_monitor:
+                monitors[f'{run.monitor.pb_version}/{PurePath(run.path).name}'] = run.monitor.last_monitor
+            if run.monitor.changed:
+                run.monitor.changed = False
+                changed = True
+        if changed:
+            save_json_atomic(Path(f'{self.cmd_path}/monitors.json'), monitors)
+
+    def save_history(self):
+        """Writes the hourly cpu/memory history of all instances to data/cmd/history.json if one of them has changed.
+
+        It changes only once per hour, so it is kept out of monitor.json and the alive file.
+        """
+        changed = False
+        history = {}
+        for run in self.run_v7 + self.run_multi + self.run_single:
+            if run.monitor.history_summary:
+                history[f'{run.monitor.pb_version}/{run.monitor.user}'] = run.monitor.history_summary
+            if run.monitor.history_changed:
+                run.monitor.history_changed = False
+                changed = True
+        if changed:
+            save_json_atomic(Path(f'{self.cmd_path}/history.json'), history)
+
+    def start_metrics(self):
+        if not self.metrics_port and not self.metrics_file:
+            return
+        self.metrics = Metrics("pbrun")
+        if self.metrics_port:
+            try:
+                self.metrics.serve(self.metrics_host, self.metrics_port)
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Metrics: http://{self.metrics_host}:{self.metrics_port}/metrics')
+            except OSError as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Metrics port {self.metrics_port}: {e}')
+
+    def update_metrics(self, loop_time: float):
+        """Publish the Monitor values of all instances and the loop timing."""
+        if not self.metrics:
+            return
+        metrics = self.metrics
+        metrics.clear()
+        metrics.add("up", 1, help="PBRun is running")
+        metrics.add("last_loop_duration_seconds", loop_time, help="Duration of the last supervisor loop")
+        for name, phase in self.timer.phases.items():
+            if name == "loop":
+                metrics.add_histogram("loop_duration_seconds", LoopTimer.BUCKETS, phase["counts"], phase["sum"], phase["count"], help="Duration of the supervisor loops")
+            else:
+                metrics.add_histogram("phase_duration_seconds", LoopTimer.BUCKETS, phase["counts"], phase["sum"], phase["count"], {"phase": name}, "Duration of the supervisor loop phases")
+        metrics.add("pending_jobs", len(self.pending), help="Starts and stops waiting in the worker pool")
+        for pb_version, runs in [("7", self.run_v7), ("6", self.run_multi), ("s", self.run_single)]:
+            for run in runs:
+                monitor = run.monitor
+                labels = {"instance": PurePath(run.path).name, "user": run.user, "pb_version": pb_version}
+                running = bool(run.bot_process and run.bot_process.process)
+                metrics.add("instance_running", running, labels, "Bot process is running")
+                metrics.add("instance_version", run.version, labels, "Config version")
+                metrics.add("instance_start_time_seconds", monitor.start_time, labels, "Start time of the bot process")
+                metrics.add("instance_cpu_percent", monitor.cpu, labels, "CPU usage of the bot process")
+                metrics.add("instance_memory_rss_bytes", monitor.memory[0] if monitor.memory else 0, labels, "Resident memory of the bot process")
+                metrics.add("instance_restarts_total", monitor.restarts, labels, "Restarts by the watcher", "counter")
+                metrics.add("instance_quarantined", monitor.quarantined, labels, "Restart budget exhausted")
+                metrics.add("instance_errors_today", monitor.errors_today, labels, "Errors logged today")
+                metrics.add("instance_errors_yesterday", monitor.errors_yesterday, labels, "Errors logged yesterday")
+                metrics.add("instance_infos_today", monitor.infos_today, labels, "Infos logged today")
+                metrics.add("instance_tracebacks_today", monitor.tracebacks_today, labels, "Tracebacks logged today")
+                metrics.add("instance_tracebacks_yesterday", monitor.tracebacks_yesterday, labels, "Tracebacks logged yesterday")
+                metrics.add("instance_pnl_today", monitor.pnl_today, labels, "Sum of PnL today")
+                metrics.add("instance_pnl_yesterday", monitor.pnl_yesterday, labels, "Sum of PnL yesterday")
+                metrics.add("instance_pnl_count_today", monitor.pnl_counter_today, labels, "Number of PnLs today")
+                metrics.add("instance_pnl_count_yesterday", monitor.pnl_counter_yesterday, labels, "Number of PnLs yesterday")
+        try:
+            metrics.publish(self.metrics_file)
+        except OSError as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Metrics file {self.metrics_file}: {e}')
+
+    def shutdown(self):
+        """Stop the helper threads of the PBRun daemon."""
+        if self._inbox:
+            self._inbox.close()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        if self.metrics:
+            self.metrics.shutdown()
+
     def run(self):
         if not self.is_running():
-            pbgdir = Path.cwd()
-            cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBRun.py')]
-            if platform.system() == "Windows":
-                creationflags = subprocess.DETACHED_PROCESS
-                creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            if not supervisor_request("PBRun", "start"):
+                pbgdir = Path.cwd()
+                cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBRun.py')]
+                if platform.system() == "Windows":
+                    creationflags = subprocess.DETACHED_PROCESS
+                    creationflags |= subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
+                else:
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            forget_service("pbrun")
             count = 0
             while True:
                 if count > 5:
@@ -1442,7 +2738,9 @@ class PBRun():
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBRun')
-            psutil.Process(self.my_pid).kill()
+            if not supervisor_request("PBRun", "stop", self.my_pid):
+                psutil.Process(self.my_pid).kill()
+            forget_service("pbrun")
 
     def restart_pbrun(self):
         if self.is_running():
@@ -1450,9 +2748,14 @@ class PBRun():
             self.run()
 
     def is_running(self):
+        alive = service_alive("pbrun")
+        if alive is not None:
+            if alive:
+                self.my_pid = service_pid("pbrun")
+            return alive
         self.load_pid()
         try:
-            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith("pbrun.py") for sub in psutil.Process(self.my_pid).cmdline()):
+            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith(("pbrun.py", "pbsupervisor.py")) for sub in psutil.Process(self.my_pid).cmdline()):
                 return True
         except psutil.NoSuchProcess:
             pass
@@ -1465,13 +2768,16 @@ class PBRun():
                 self.my_pid = int(pid) if pid.isnumeric() else None
 
     def save_pid(self):
-        """Saves the process ID into /data/pid/pbrun.pid."""
+        """Saves the process ID into /data/pid/pbrun.pid. Returns False if another process holds the lock of PBRun."""
+        if not lock_service("pbrun", retry=2):
+            return False
         self.my_pid = os.getpid()
         with open(self.pidfile, 'w') as f:
             f.write(str(self.my_pid))
+        return True
 
 
-def main():
+def main(stop: threading.Event = None):
     """
     Main function of PBRun, responsible for starting and logging passivbot instances.
 
@@ -1480,57 +2786,94 @@ def main():
     - Logs in pbgui/data/logs/PBRun.log and creates a .old if the file is too heavy.
     - Create and monitor single, multi and instances of passivbot. (Instances will be deleted in future versions)
     """
+    if stop is None:
+        stop = threading.Event()
     pbgdir = Path.cwd()
     dest = Path(f'{pbgdir}/data/logs')
     if not dest.exists():
         dest.mkdir(parents=True)
     logfile = Path(f'{str(dest)}/PBRun.log')
-    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+    set_logfile(logfile)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBRun')
     run = PBRun()
     if run.is_running():
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBRun already started')
+        exit(1)
+    if not run.save_pid():
+        reset_logfile()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBRun already started')
         exit(1)
-    run.save_pid()
+    run.start_metrics()
     run.watch_v7()
     run.watch_multi()
     run.watch_single()
-    count = 0
-    while True:
+    while not stop.is_set():
         try:
+            heartbeat_service("pbrun")
+            loop_start = monotonic()
             if logfile.exists():
                 if logfile.stat().st_size >= 1048576:
                     logfile.replace(f'{str(logfile)}.old')
-                    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-                    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-            run.has_activate()
-            run.has_update_status()
-            for run_v7 in run.run_v7:
-                run_v7.watch()
-                run_v7.watch_dynamic()
-                run_v7.monitor.watch_log()
-            for run_multi in run.run_multi:
-                run_multi.watch()
-                run_multi.watch_dynamic()
-                run_multi.monitor.watch_log()
-            for run_single in run.run_single:
-                run_single.watch()
-                run_single.monitor.watch_log()
-            if count%2 == 0:
+                    set_logfile(logfile)
+            with run.timer.phase("commands"):
+                if run.inbox.has_commands():
+                    run.has_activate()
+                    run.has_update_status()
+            # Liveness on every loop
+            with run.timer.phase("watch"):
+                # Rescan the process table once per loop
+                run.processes.invalidate()
                 for run_v7 in run.run_v7:
-                    run_v7.clean_log()
+                    run.watch(run_v7)
                 for run_multi in run.run_multi:
-                    run_multi.clean_log()
+                    run.watch(run_multi)
                 for run_single in run.run_single:
-                    run_single.clean_log()
-            sleep(5)
-            count += 1
+                    run.watch(run_single)
+            if run.schedule.due("dynamic"):
+                with run.timer.phase("dynamic"):
+                    for run_v7 in run.run_v7:
+                        run_v7.watch_dynamic()
+                    for run_multi in run.run_multi:
+                        if run_multi.watch_dynamic() and run_multi.is_running():
+                            # a stopped bot reads the new multi_run.hjson on its next start
+                            run.submit(run_multi, run_multi.stop, run_multi.start)
+            if run.schedule.due("logs"):
+                with run.timer.phase("logs"):
+                    for run_v7 in run.run_v7:
+                        run_v7.monitor.watch_log()
+                    for run_multi in run.run_multi:
+                        run_multi.monitor.watch_log()
+                    for run_single in run.run_single:
+                        run_single.monitor.watch_log()
+                    if run.monitors_file:
+                        run.save_monitors()
+            if run.schedule.due("resources"):
+                with run.timer.phase("resources"):
+                    for bot in run.run_v7 + run.run_multi + run.run_single:
+                        process = bot.pid()
+                        if process:
+                            bot.monitor.sample_resources(process)
+                    run.save_history()
+            if run.schedule.due("clean_log"):
+                with run.timer.phase("clean_log"):
+                    for run_v7 in run.run_v7:
+                        run_v7.clean_log()
+                    for run_multi in run.run_multi:
+                        run_multi.clean_log()
+                    for run_single in run.run_single:
+                        run_single.clean_log()
+            loop_time = monotonic() - loop_start
+            run.timer.observe("loop", loop_time)
+            run.timer.log()
+            run.update_metrics(loop_time)
+            # Sleep only for the rest of the tick
+            run.inbox.wait(max(run.tick - (monotonic() - loop_start), 0))
         except Exception as e:
             print(f'Something went wrong, but continue {e}')
             traceback.print_exc()
+    # Only reached if PBSupervisor stops the PBRun thread, the bots keep running
+    run.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,7 +4,8 @@ import sys
 import os
 from pathlib import Path, PurePath
 from time import sleep
-from io import TextIOWrapper
+import threading
+from pbgui_purefunc import set_logfile, reset_logfile, supervisor_request, lock_service, heartbeat_service, service_alive, service_pid, forget_service
 from datetime import datetime
 from Instance import Instances
 import platform
@@ -23,14 +24,16 @@ class PBStat(Instances):
 
     def run(self):
         if not self.is_running():
-            pbgdir = Path.cwd()
-            cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBStat.py')]
-            if platform.system() == "Windows":
-                creationflags = subprocess.DETACHED_PROCESS
-                creationflags |= subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
-            else:
-                subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            if not supervisor_request("PBStat", "start"):
+                pbgdir = Path.cwd()
+                cmd = [sys.executable, '-u', PurePath(f'{pbgdir}/PBStat.py')]
+                if platform.system() == "Windows":
+                    creationflags = subprocess.DETACHED_PROCESS
+                    creationflags |= subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, creationflags=creationflags)
+                else:
+                    subprocess.Popen(cmd, stdout=None, stderr=None, cwd=pbgdir, text=True, start_new_session=True)
+            forget_service("pbstat")
             count = 0
             while True:
                 if count > 10:
@@ -43,7 +46,9 @@ class PBStat(Instances):
     def stop(self):
         if self.is_running():
             print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBStat')
-            psutil.Process(self.my_pid).kill()
+            if not supervisor_request("PBStat", "stop", self.my_pid):
+                psutil.Process(self.my_pid).kill()
+            forget_service("pbstat")
 
     def restart(self):
         if self.is_running():
@@ -51,9 +56,14 @@ class PBStat(Instances):
             self.run()
 
     def is_running(self):
+        alive = service_alive("pbstat")
+        if alive is not None:
+            if alive:
+                self.my_pid = service_pid("pbstat")
+            return alive
         self.load_pid()
         try:
-            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith("pbstat.py") for sub in psutil.Process(self.my_pid).cmdline()):
+            if self.my_pid and psutil.pid_exists(self.my_pid) and any(sub.lower().endswith(("pbstat.py", "pbsupervisor.py")) for sub in psutil.Process(self.my_pid).cmdline()):
                 return True
         except psutil.NoSuchProcess:
             pass
@@ -66,9 +76,13 @@ class PBStat(Instances):
                 self.my_pid = int(pid) if pid.isnumeric() else None
 
     def save_pid(self):
+        """Returns False if another process holds the lock of PBStat."""
+        if not lock_service("pbstat", retry=2):
+            return False
         self.my_pid = os.getpid()
         with open(self.pidfile, 'w') as f:
             f.write(str(self.my_pid))
+        return True
 
     def fetch_all(self):
         self.fetch_status()
@@ -85,7 +99,9 @@ class PBStat(Instances):
                 instance.save_status()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} End Fetch status')
 
-def main():
+def main(stop: threading.Event = None):
+    if stop is None:
+        stop = threading.Event()
     logging.getLogger("streamlit.runtime.state.session_state_proxy").disabled=True
     logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled=True
     pbgdir = Path.cwd()
@@ -93,30 +109,31 @@ def main():
     if not dest.exists():
         dest.mkdir(parents=True)
     logfile = Path(f'{str(dest)}/PBStat.log')
-    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+    set_logfile(logfile)
     print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBStat')
     stat = PBStat()
     if stat.is_running():
-        sys.stdout = sys.__stdout__
-        sys.stderr = sys.__stderr__
+        reset_logfile()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBStat already started')
+        exit(1)
+    if not stat.save_pid():
+        reset_logfile()
         print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBStat already started')
         exit(1)
-    stat.save_pid()
     trade_count = 0
-    while True:
+    while not stop.is_set():
         try:
+            heartbeat_service("pbstat")
             if logfile.exists():
                 if logfile.stat().st_size >= 10485760:
                     logfile.replace(f'{str(logfile)}.old')
-                    sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
-                    sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+                    set_logfile(logfile)
             if trade_count%5 == 0:
                 stat.fetch_all()
             else:
                 stat.fetch_status()
             trade_count += 1
-            sleep(60)
+            stop.wait(60)
             # Refresh Instances if there are some new or removed
             stat.instances = []
             stat.load()
@@ -0,0 +1,180 @@
+"""
+PBSupervisor runs PBRun, PBRemote, PBData, PBStat and PBCoinData as threads of one python process.
+
+Every service is a separate process by default and every process imports its own copy of ccxt, pandas, streamlit, ...
+On a small VPS this costs hundreds of MB. PBSupervisor imports the modules once and runs the main() of every
+service in its own thread. Start it instead of the services:
+
+    python PBSupervisor.py
+
+The services keep their pid files (with the pid of PBSupervisor) and logfiles, so start/stop from Services and
+starter.py work as before: run() and stop() of a service send a request file data/pid/<service>.start/.stop to
+PBSupervisor if it hosts the service. Which services are hosted can be set in pbgui.ini:
+
+    [supervisor]
+    services = PBRun,PBRemote,PBData,PBStat,PBCoinData
+"""
+import importlib
+import threading
+import os
+import sys
+import signal
+import traceback
+from pathlib import Path
+from time import monotonic
+from datetime import datetime
+from pbgui_purefunc import PBGDIR, ThreadLog, supervisor_pid, supervisor_services, unlock_service
+
+class Service():
+    """One service running as thread in PBSupervisor."""
+    def __init__(self, name: str):
+        self.name = name
+        self.pidfile = Path(f'{PBGDIR}/data/pid/{name.lower()}.pid')
+        self.thread = None
+        self.stop_event = None
+        # stopped by request, do not restart
+        self.stopped = False
+        self.start_ts = 0
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def main(self):
+        try:
+            module = importlib.import_module(self.name)
+            module.main(self.stop_event)
+        except SystemExit:
+            pass
+        except Exception as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: {self.name} {e}')
+            traceback.print_exc()
+        finally:
+            unlock_service(self.name.lower())
+            self.remove_pid()
+
+    def remove_pid(self):
+        """Remove the pid file if it belongs to PBSupervisor, the service is not running anymore."""
+        if self.pidfile.exists():
+            pid = self.pidfile.read_text().strip()
+            if pid == str(os.getpid()):
+                self.pidfile.unlink(missing_ok=True)
+
+    def start(self):
+        if self.is_alive():
+            return
+        # pid file left from a thread that died
+        self.remove_pid()
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: {self.name}')
+        self.stopped = False
+        self.start_ts = monotonic()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.main, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: int = 60):
+        """Ask the service to leave its main loop and wait for it. Returns False if it is still running."""
+        self.stopped = True
+        if not self.is_alive():
+            return True
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: {self.name}')
+        self.stop_event.set()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: {self.name} did not stop within {timeout} seconds')
+            return False
+        return True
+
+class PBSupervisor():
+    def __init__(self):
+        self.piddir = Path(f'{PBGDIR}/data/pid')
+        if not self.piddir.exists():
+            self.piddir.mkdir(parents=True)
+        self.pidfile = Path(f'{self.piddir}/pbsupervisor.pid')
+        self.my_pid = None
+        self.restart_delay = 60
+        self.services = {name: Service(name) for name in supervisor_services()}
+
+    def is_running(self):
+        pid = supervisor_pid()
+        return pid is not None and pid != os.getpid()
+
+    def save_pid(self):
+        self.my_pid = os.getpid()
+        with open(self.pidfile, 'w') as f:
+            f.write(str(self.my_pid))
+
+    def start_all(self):
+        for service in self.services.values():
+            service.start()
+
+    def stop_all(self):
+        # let all services leave their loops at the same time
+        for service in self.services.values():
+            if service.stop_event:
+                service.stop_event.set()
+        for service in self.services.values():
+            service.stop()
+
+    def requests(self):
+        """Handle the start/stop requests from Services. Stops before starts, so a restart works in one round."""
+        for action in ["stop", "start"]:
+            for service in self.services.values():
+                request = Path(f'{self.piddir}/{service.name.lower()}.{action}')
+                if not request.exists():
+                    continue
+                if action == "stop":
+                    if not service.stop():
+                        # try again on the next round
+                        continue
+                else:
+                    service.start()
+                request.unlink(missing_ok=True)
+
+    def watch(self):
+        """Restart services that died unexpectedly, at most once per restart_delay."""
+        for service in self.services.values():
+            if service.stopped or service.is_alive():
+                continue
+            if monotonic() - service.start_ts < self.restart_delay:
+                continue
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Warning: {service.name} is not running')
+            service.start()
+
+def main():
+    dest = Path(f'{PBGDIR}/data/logs')
+    if not dest.exists():
+        dest.mkdir(parents=True)
+    logfile = Path(f'{str(dest)}/PBSupervisor.log')
+    supervisor = PBSupervisor()
+    if supervisor.is_running():
+        print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: PBSupervisor already started')
+        exit(1)
+    sys.stdout = sys.stderr = ThreadLog(logfile)
+    print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Start: PBSupervisor {", ".join(supervisor.services)}')
+    supervisor.save_pid()
+    # old requests are obsolete
+    for request in list(supervisor.piddir.glob("*.start")) + list(supervisor.piddir.glob("*.stop")):
+        request.unlink(missing_ok=True)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    supervisor.start_all()
+    while not stop.is_set():
+        try:
+            if logfile.exists():
+                if logfile.stat().st_size >= 10485760:
+                    logfile.replace(f'{str(logfile)}.old')
+                    sys.stdout.set_default(logfile)
+            supervisor.requests()
+            supervisor.watch()
+            stop.wait(1)
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f'Something went wrong, but continue {e}')
+            traceback.print_exc()
+    supervisor.stop_all()
+    supervisor.pidfile.unlink(missing_ok=True)
+    print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Stop: PBSupervisor')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+RcloneRC runs one long-lived `rclone rcd` for PBRemote and submits sync/copy jobs to its remote control API.
+
+Every `rclone sync` started as a new process reads rclone.conf, authenticates and lists the remote again.
+With rcd this is done once per daemon lifetime, the transfers are started as async jobs and polled until done.
+
+The rcd listens on 127.0.0.1 on a free port with a random user and password. If rcd can not be started or dies,
+run() returns False and the caller falls back to spawning rclone.
+
+The rcd itself only logs notices, run() writes the transferred files and totals of every job to the log of the caller
+in the format of `rclone -v`.
+"""
+import subprocess
+import os
+import threading
+import platform
+import socket
+import secrets
+import json
+import base64
+import urllib.request
+import urllib.error
+from time import sleep, monotonic
+from datetime import datetime
+
+class RcloneRC():
+    def __init__(self, logfile: str = None):
+        self.logfile = logfile
+        self.process = None
+        self.url = None
+        self.auth = None
+        self.failed_ts = 0
+        # start() is called by the sync workers of PBRemote at the same time
+        self.lock = threading.Lock()
+        # do not try to start rcd again for retry seconds after a failure
+        self.retry = 300
+
+    def free_port(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start rclone rcd and wait until it answers. Returns False if it is not available."""
+        with self.lock:
+            if self.is_running():
+                return True
+            if self.failed_ts and monotonic() - self.failed_ts < self.retry:
+                return False
+            port = self.free_port()
+            user = secrets.token_hex(8)
+            password = secrets.token_hex(16)
+            cmd = ['rclone', 'rcd', '--rc-addr', f'127.0.0.1:{port}', '--log-level', 'NOTICE']
+            if self.logfile:
+                cmd += ['--log-file', str(self.logfile)]
+            # credentials in the environment, the command line can be read by every local user
+            env = dict(os.environ, RCLONE_RC_USER=user, RCLONE_RC_PASS=password)
+            try:
+                if platform.system() == "Windows":
+                    creationflags = subprocess.CREATE_NO_WINDOW
+                    self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, creationflags=creationflags)
+                else:
+                    self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, start_new_session=True)
+            except OSError as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: Can not start rclone rcd {e}')
+                self.failed_ts = monotonic()
+                return False
+            self.url = f'http://127.0.0.1:{port}'
+            self.auth = base64.b64encode(f'{user}:{password}'.encode()).decode()
+            for _ in range(50):
+                if self.process.poll() is not None:
+                    break
+                try:
+                    self.call("rc/noop", {}, timeout=1)
+                    print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Started rclone rcd on {self.url}')
+                    return True
+                except (urllib.error.URLError, OSError):
+                    sleep(0.1)
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone rcd did not start, use rclone commands')
+            self.quit()
+            self.failed_ts = monotonic()
+            return False
+
+    def stop(self):
+        with self.lock:
+            self.quit()
+
+    def quit(self):
+        if self.is_running():
+            try:
+                self.call("core/quit", {}, timeout=5)
+                self.process.wait(timeout=10)
+            except (urllib.error.URLError, OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+        self.process = None
+
+    def call(self, command: str, params: dict, timeout: float = 30):
+        """POST params to the rc command and return the json answer. Raises RuntimeError on rc errors."""
+        request = urllib.request.Request(f'{self.url}/{command}', data=json.dumps(params).encode(), method="POST")
+        request.add_header("Content-Type", "application/json")
+        request.add_header("Authorization", f'Basic {self.auth}')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.load(e).get("error", str(e))
+            except ValueError:
+                error = str(e)
+            raise RuntimeError(error)
+
+    def params(self, cmd: list):
+        """Translate a rclone sync/copy command line (as used by PBRemote) to the rc command and its parameters.
+
+        Returns:
+            tuple: (rc command, params) or None if the command line is not supported.
+        """
+        if len(cmd) < 4 or cmd[0] != 'rclone' or cmd[1] not in ['sync', 'copy']:
+            return None
+        rules = {"IncludeRule": [], "ExcludeRule": []}
+        files_from = []
+        paths = []
+        args = [str(arg) for arg in cmd[2:]]
+        while args:
+            arg = args.pop(0)
+            if arg in ['-v', '-q']:
+                continue
+            elif arg == '--include':
+                rules["IncludeRule"].append(args.pop(0))
+            elif arg == '--exclude':
+                rules["ExcludeRule"].append(args.pop(0))
+            elif arg == '--files-from':
+                files_from.append(args.pop(0))
+            elif arg.startswith('-'):
+                return None
+            else:
+                paths.append(arg)
+        if len(paths) != 2:
+            return None
+        params = {"srcFs": paths[0], "dstFs": paths[1], "_async": True}
+        _filter = {key: value for key, value in rules.items() if value}
+        if files_from:
+            _filter["FilesFrom"] = files_from
+        if _filter:
+            params["_filter"] = _filter
+        return f'sync/{cmd[1]}', params
+
+    def run(self, cmd: list, timeout: float = 3600, log = None):
+        """Run a rclone sync/copy command line as async job and wait for it. The job result is written to log (binary).
+
+        Returns:
+            bool: True if the job ran (successful or not), False if the caller must run the command itself.
+        """
+        translated = self.params(cmd)
+        if translated is None or not self.start():
+            return False
+        command, params = translated
+        try:
+            jobid = self.call(command, params)["jobid"]
+        except (urllib.error.URLError, OSError, RuntimeError, KeyError, ValueError) as e:
+            print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone rcd {command} {e}')
+            if not self.is_running():
+                self.failed_ts = monotonic()
+            return False
+        start = monotonic()
+        delay = 0.05
+        while True:
+            sleep(delay)
+            delay = min(delay * 2, 1)
+            try:
+                status = self.call("job/status", {"jobid": jobid})
+            except (urllib.error.URLError, OSError, RuntimeError, ValueError) as e:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone rcd job {jobid} {e}')
+                return self.is_running()
+            if status.get("finished"):
+                if not status.get("success"):
+                    print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone {command} {params["srcFs"]} -> {params["dstFs"]}: {status.get("error")}')
+                self.report(log, jobid, command, params, status)
+                return True
+            if monotonic() - start > timeout:
+                print(f'{datetime.now().isoformat(sep=" ", timespec="seconds")} Error: rclone {command} {params["srcFs"]} -> {params["dstFs"]} timeout after {timeout}s')
+                try:
+                    self.call("job/stop", {"jobid": jobid})
+                except (urllib.error.URLError, OSError, RuntimeError, ValueError):
+                    pass
+                return True
+
+    def report(self, log, jobid: int, command: str, params: dict, status: dict):
+        """Write the transferred files and the stats of a finished job to log and drop its stats group in rcd."""
+        if log is None:
+            return
+        group = f'job/{jobid}'
+        lines = []
+        stats = {}
+        try:
+            for transfer in self.call("core/transferred", {"group": group}).get("transferred", []):
+                if transfer.get("checked"):
+                    continue
+                if transfer.get("error"):
+                    lines.append(f'ERROR : {transfer.get("name")}: {transfer["error"]}')
+                else:
+                    lines.append(f'INFO  : {transfer.get("name")}: Copied ({transfer.get("size", 0)} bytes)')
+            stats = self.call("core/stats", {"group": group})
+            self.call("core/stats-delete", {"group": group})
+        except (urllib.error.URLError, OSError, RuntimeError, ValueError) as e:
+            lines.append(f'ERROR : rclone rcd job {jobid} stats: {e}')
+        lines.append(f'INFO  : {command} {params["srcFs"]} -> {params["dstFs"]}: {stats.get("transfers", 0)} transfers, '
+                     f'{stats.get("bytes", 0)} bytes, {stats.get("checks", 0)} checks, {stats.get("deletes", 0)} deletes, '
+                     f'{stats.get("errors", 0)} errors, {status.get("duration", 0):.1f}s')
+        if not status.get("success"):
+            lines.append(f'ERROR : {command} {params["srcFs"]} -> {params["dstFs"]}: {status.get("error")}')
+        timestamp = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+        log.write("".join(f'{timestamp} {line}\n' for line in lines).encode())
+        log.flush()
+
+
+def main():
+    print("Don't Run this Class from CLI")
+
+if __name__ == '__main__':
+    main()
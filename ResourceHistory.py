@@ -0,0 +1,122 @@
+"""
+ResourceHistory records cpu and memory (rss) of a passivbot instance in a ring buffer on disk.
+
+PBRun samples every bot on every resources_interval and writes one record per minute (average cpu, max rss)
+to <instance>/resources.bin. The file has a fixed size: 7 days with 1-minute resolution are 10080 records
+of 12 bytes (~118 KB per bot). Older records are overwritten.
+
+An hourly summary of the last 7 days is written to data/cmd/history.json and synced with the cmd files (only when it
+changed), so the Monitor page can chart it for remote servers too.
+"""
+import struct
+from pathlib import Path
+from datetime import datetime
+
+class ResourceHistory():
+    MAGIC = b"PBRH"
+    VERSION = 1
+    # magic, version, resolution in seconds, number of slots
+    HEADER = struct.Struct("<4sHHI")
+    # timestamp, cpu in percent, rss in KB
+    RECORD = struct.Struct("<IfI")
+
+    def __init__(self, file: str, resolution: int = 60, slots: int = 10080):
+        self.file = Path(file)
+        self.resolution = resolution
+        self.slots = slots
+        # current slot: timestamp, cpu sum, number of cpu samples, max rss
+        self.slot_ts = None
+        self.cpu_sum = 0.0
+        self.cpu_count = 0
+        self.rss_max = 0
+
+    def create(self):
+        with open(self.file, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.resolution, self.slots))
+            f.truncate(self.HEADER.size + self.slots * self.RECORD.size)
+
+    def is_valid(self):
+        try:
+            with open(self.file, "rb") as f:
+                header = f.read(self.HEADER.size)
+        except FileNotFoundError:
+            return False
+        if len(header) != self.HEADER.size:
+            return False
+        return self.HEADER.unpack(header) == (self.MAGIC, self.VERSION, self.resolution, self.slots)
+
+    def sample(self, cpu: float, rss: int, ts: float = None):
+        """Add one sample. The record of a slot is written as soon as the first sample of the next slot arrives."""
+        if ts is None:
+            ts = datetime.now().timestamp()
+        slot_ts = int(ts) // self.resolution * self.resolution
+        if self.slot_ts is not None and slot_ts != self.slot_ts:
+            self.flush()
+        self.slot_ts = slot_ts
+        self.cpu_sum += cpu
+        self.cpu_count += 1
+        self.rss_max = max(self.rss_max, rss)
+
+    def flush(self):
+        if self.slot_ts is None or not self.cpu_count:
+            return
+        self.write(self.slot_ts, self.cpu_sum / self.cpu_count, self.rss_max)
+        self.slot_ts = None
+        self.cpu_sum = 0.0
+        self.cpu_count = 0
+        self.rss_max = 0
+
+    def write(self, ts: int, cpu: float, rss: int):
+        if not self.is_valid():
+            self.create()
+        slot = ts // self.resolution % self.slots
+        with open(self.file, "r+b") as f:
+            f.seek(self.HEADER.size + slot * self.RECORD.size)
+            f.write(self.RECORD.pack(ts, cpu, rss // 1024))
+
+    def read(self, since: float = 0):
+        """Returns [(timestamp, cpu, rss in bytes), ...] of the records newer than since, sorted by time."""
+        if not self.is_valid():
+            return []
+        with open(self.file, "rb") as f:
+            f.seek(self.HEADER.size)
+            data = f.read(self.slots * self.RECORD.size)
+        oldest = datetime.now().timestamp() - self.slots * self.resolution
+        records = []
+        for ts, cpu, rss in self.RECORD.iter_unpack(data[:len(data) // self.RECORD.size * self.RECORD.size]):
+            if ts and ts > since and ts > oldest:
+                records.append((ts, cpu, rss * 1024))
+        records.sort()
+        return records
+
+    def summary(self, resolution: int = 3600):
+        """Downsample the records to resolution (average cpu, max rss) for monitor.json.
+
+        Returns:
+            dict: {"t": first timestamp, "r": resolution, "c": [cpu, ...], "m": [rss in MB, ...]}, None without records.
+                  Buckets without records are null.
+        """
+        records = self.read()
+        if not records:
+            return None
+        first = records[0][0] // resolution * resolution
+        count = (records[-1][0] - first) // resolution + 1
+        cpu = [[] for _ in range(count)]
+        rss = [0] * count
+        for ts, record_cpu, record_rss in records:
+            bucket = (ts - first) // resolution
+            cpu[bucket].append(record_cpu)
+            rss[bucket] = max(rss[bucket], record_rss)
+        return {
+            "t": first,
+            "r": resolution,
+            "c": [round(sum(values) / len(values), 1) if values else None for values in cpu],
+            "m": [round(value / 1048576) if value else None for value in rss]
+        }
+
+
+def main():
+    print("Don't Run this Class from CLI")
+
+if __name__ == '__main__':
+    main()
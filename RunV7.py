@@ -44,6 +44,14 @@ class V7Instance():
         else:
             version = 0
         return version
+    @property
+    def deferred(self):
+        """Why PBRun on enabled_on defers the start (not enough memory, ...), None if it does not."""
+        if self.enabled_on == self.remote.name:
+            return self.remote.local_run.instances_status_v7.find_deferred(self.user)
+        elif self.enabled_on in self.remote.list():
+            return self.remote.find_server(self.enabled_on).instances_status_v7.find_deferred(self.user)
+        return None
 
     def initialize(self):
         # Init config
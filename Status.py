@@ -8,6 +8,8 @@ Each status includes informations such as the name, the version, where it is sup
 This status list is then sent through PBRemote to the remote storage, enabling us to manage bots from the master server.
 """
 from pathlib import Path
+from contextlib import contextmanager
+from pbgui_purefunc import save_text_atomic
 import json
 
 class InstanceStatus():
@@ -18,12 +20,35 @@ class InstanceStatus():
         self.multi = None
         self.enabled_on = None
         self.running = None
+        # reason why PBRun defers the start (not enough memory, ...) or None
+        self.deferred = None
+        # seq of the status file when this instance changed last
+        self.seq = 0
+
+    def fields(self):
+        return (self.enabled_on, self.version, self.multi, self.running, self.deferred)
 
 class InstancesStatus():
-    """Stores every InstanceStatus into status.json, manages and loads them."""
+    """Stores every InstanceStatus into status.json, manages and loads them.
+
+    The instances are kept in a dict by name. save() only writes the file if its content changed.
+
+    seq is the change counter: every saved change of an instance gets the next seq and an entry [seq, name, op]
+    in the journal (op is "update" or "remove"), so peers can apply only the changes since their last seq.
+    """
+    JOURNAL_SIZE = 200
+
     def __init__(self, status_file: str): 
         """status_file (str): Path to the status file."""
-        self.instances = []
+        self._instances = {}
+        self.saved = None
+        # depth of nested batch() blocks, save() is deferred while > 0
+        self._batch_depth = 0
+        self.save_pending = False
+        self.seq = 0
+        self.journal = []
+        # name: (fields, seq) of the last save
+        self.snapshot = {}
         self.index = 0
         self.pbname = None
         self.activate_ts = 0
@@ -33,9 +58,21 @@ class InstancesStatus():
         self.status_ts = 0
         self.load()
 
+    @property
+    def instances(self):
+        return list(self._instances.values())
+
+    @instances.setter
+    def instances(self, new_instances: list):
+        self._instances = {instance.name: instance for instance in new_instances}
+
     def __iter__(self):
+        # iterate over a copy, callers remove instances while iterating
         return iter(self.instances)
 
+    def __len__(self):
+        return len(self._instances)
+
     def __next__(self):
         if self.index > len(self.instances):
             raise StopIteration
@@ -44,7 +81,7 @@ class InstancesStatus():
 
     def list(self): # Never referenced ?
         """Returns a list of names of all the passivbot instances in the status list."""
-        return list(map(lambda c: c.name, self.instances))
+        return list(self._instances)
 
     def add(self, istatus: InstanceStatus):
         """
@@ -53,11 +90,7 @@ class InstancesStatus():
         Args:
             istatus (InstanceStatus): The instance status to add or to update.
         """
-        for index, instance in enumerate(self.instances):
-            if instance.name == istatus.name:
-                self.instances[index] = istatus
-                return
-        self.instances.append(istatus)
+        self._instances[istatus.name] = istatus
 
     def remove(self, istatus: InstanceStatus):
         """
@@ -66,17 +99,14 @@ class InstancesStatus():
         Args:
             istatus (InstanceStatus): The instance status to remove.
         """
-        for index, instance in enumerate(self.instances):
-            if instance.name == istatus.name:
-                self.instances.pop(index)
-                return
+        self._instances.pop(istatus.name, None)
 
     def is_running(self, name: str):
         # if self.has_new_status():
         #     self.load()
-        for instance in self.instances:
-            if instance.name == name:
-                return instance.running
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance.running
 
     def find_name(self, name: str):
         """
@@ -85,10 +115,13 @@ class InstancesStatus():
         Returns:
             InstanceStatus: The instance with the specified name, or None if not found.
         """
-        for instance in self.instances:
-            if instance.name == name:
-                return instance
-        return None
+        return self._instances.get(name)
+
+    def find_deferred(self, name: str):
+        """Returns why PBRun defers the start of the instance, or None."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance.deferred
 
     def find_version(self, name: str):
         """
@@ -100,9 +133,9 @@ class InstancesStatus():
         Returns:
             str: The version of the instance, or 0 if not found.
         """
-        for instance in self.instances:
-            if instance.name == name:
-                return instance.version
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance.version
         return 0
 
     def has_new_status(self):
@@ -128,6 +161,10 @@ class InstancesStatus():
                 if "activate_ts" in instances:
                     self.activate_ts = instances["activate_ts"]
                     self.activate_pbname = instances["activate_pbname"]
+                    # status files without seq (older versions) always need a full sync
+                    self.seq = instances.get("seq", 0)
+                    self.journal = instances.get("journal", [])
+                    loaded = {}
                     for instance in instances["instances"]:
                         status = InstanceStatus()
                         status.name = instance
@@ -135,26 +172,85 @@ class InstancesStatus():
                         status.multi = instances["instances"][instance]["multi"]
                         status.enabled_on = instances["instances"][instance]["enabled_on"]
                         status.running = instances["instances"][instance]["running"]
-                        self.add(status)
+                        status.deferred = instances["instances"][instance].get("deferred")
+                        status.seq = instances["instances"][instance].get("seq", 0)
+                        loaded[status.name] = status
+                    self._instances = loaded
+                    self.snapshot = {name: (status.fields(), status.seq) for name, status in loaded.items()}
+
+    def changes_since(self, seq: int):
+        """Journal entries [seq, name, op] newer than seq.
+
+        Returns:
+            list: The changes, or None if the journal does not reach back to seq and everything must be synced.
+        """
+        if seq > self.seq:
+            # status file was recreated
+            return None
+        if seq == self.seq:
+            return []
+        if not self.journal or self.journal[0][0] > seq + 1:
+            return None
+        return [entry for entry in self.journal if entry[0] > seq]
+
+    def update_journal(self):
+        """Give changed instances the next seq and record them and removed instances in the journal."""
+        for name, instance in self._instances.items():
+            fields = instance.fields()
+            if name in self.snapshot and self.snapshot[name][0] == fields:
+                instance.seq = self.snapshot[name][1]
+                continue
+            self.seq += 1
+            instance.seq = self.seq
+            self.journal.append([self.seq, name, "update"])
+        for name in self.snapshot:
+            if name not in self._instances:
+                self.seq += 1
+                self.journal.append([self.seq, name, "remove"])
+        self.journal = self.journal[-self.JOURNAL_SIZE:]
+        self.snapshot = {name: (instance.fields(), instance.seq) for name, instance in self._instances.items()}
+
+    @contextmanager
+    def batch(self):
+        """Defer all save() calls inside the with block to one save at its end."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self.save_pending:
+                self.save()
 
     def save(self):
-        """Saves the current status information to the status file."""
+        """Saves the current status information to the status file, if it changed since the last save."""
+        if self._batch_depth:
+            self.save_pending = True
+            return
+        self.save_pending = False
+        self.update_journal()
         instances = {}
-        for instance in self.instances:
+        for instance in self._instances.values():
             instances[instance.name] = ({
                 "enabled_on" : instance.enabled_on,
                 "version": instance.version,
                 "multi": instance.multi,
-                "running": instance.running
+                "running": instance.running,
+                "deferred": instance.deferred,
+                "seq": instance.seq
             })
         status = {
             "activate_ts": self.activate_ts,
             "activate_pbname": self.pbname,
+            "seq": self.seq,
+            "journal": self.journal,
             "instances": instances
         }
+        status = json.dumps(status, separators=(',', ':'))
         file = Path(self.status_file)
-        with open(file, "w", encoding='utf-8') as f:
-            json.dump(status, f, indent=4)
+        if status == self.saved and file.exists():
+            return
+        save_text_atomic(file, status)
+        self.saved = status
 
 
 def main():
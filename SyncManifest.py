@@ -0,0 +1,98 @@
+"""
+SyncManifest lists the files of an instance tree (run_v7, multi, instances) with size and md5.
+
+PBRemote saves the manifest of every tree to data/cmd/manifest_<tree>.json and uploads it together with the
+status file, so it arrives at the peers with the status sync of the cmd dirs. A peer compares the manifest with
+its local copy of the tree and fetches only the changed files with `rclone copy --files-from` instead of letting
+rclone list the whole tree in the bucket.
+
+The manifest has the seq of the status file it was built with. A peer only uses it if the seq matches the
+status file, otherwise it syncs the tree as before.
+"""
+import json
+import hashlib
+import fnmatch
+from pathlib import Path
+from pbgui_purefunc import save_json_atomic
+
+# files that define an instance
+TREES = {
+    "run_v7": ["config.json"],
+    "multi": ["multi.hjson", "*.json"],
+    "instances": ["instance.cfg", "config.json"],
+}
+# rewritten by PBRun all the time, they would almost never match the manifest
+VOLATILE = ["monitor.json", "ignored_coins.json"]
+
+class SyncManifest():
+    def __init__(self, file: str = None):
+        self.file = Path(file) if file else None
+        self.seq = 0
+        self.patterns = []
+        # relative path: [size, md5, mtime_ns], mtime_ns is only used to skip hashing unchanged files
+        self.files = {}
+
+    def load(self):
+        """Returns False if there is no valid manifest."""
+        try:
+            with open(self.file, "r", encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.seq = manifest["seq"]
+            self.patterns = manifest["patterns"]
+            self.files = manifest["files"]
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def save(self):
+        manifest = {
+            "seq": self.seq,
+            "patterns": self.patterns,
+            "files": self.files
+        }
+        save_json_atomic(self.file, manifest)
+
+    def scan(self, root: str, patterns: list):
+        """Rebuild the file list from root. Files with unchanged size and mtime keep their md5."""
+        root = Path(root)
+        files = {}
+        if root.exists():
+            for file in root.rglob("*"):
+                if file.name in VOLATILE or not any(fnmatch.fnmatch(file.name, pattern) for pattern in patterns):
+                    continue
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                if not file.is_file():
+                    continue
+                path = file.relative_to(root).as_posix()
+                old = self.files.get(path)
+                if old and old[0] == stat.st_size and old[2] == stat.st_mtime_ns:
+                    files[path] = old
+                    continue
+                files[path] = [stat.st_size, self.md5(file), stat.st_mtime_ns]
+        self.patterns = patterns
+        self.files = files
+
+    def md5(self, file: Path):
+        with open(file, "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    def diff(self, local: "SyncManifest"):
+        """Compare with the local manifest of the same tree.
+
+        Returns:
+            tuple: (files to fetch, files to remove), relative paths
+        """
+        fetch = sorted(path for path, (size, md5, *_) in self.files.items()
+                       if path not in local.files or local.files[path][:2] != [size, md5])
+        remove = sorted(path for path in local.files if path not in self.files)
+        return fetch, remove
+
+
+def main():
+    print("Don't Run this Class from CLI")
+
+if __name__ == '__main__':
+    main()
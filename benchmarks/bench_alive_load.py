@@ -0,0 +1,101 @@
+"""
+Benchmark of RemoteServer.load() with a synthetic fleet of remote servers.
+
+Creates data/remote/cmd_<server> dirs with 10 alive_<timestamp>.cmd.gz files and alive.cmd.gz each in a
+temporary directory and compares the old load (glob, gunzip and parse the newest file on every call) with
+the cached load of PBRemote.
+
+    python benchmarks/bench_alive_load.py [servers] [passes]
+"""
+import sys
+import gzip
+import json
+import glob
+import random
+import shutil
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from PBRemote import RemoteServer
+
+def alive_cfg(name: str, timestamp: int):
+    monitor = [{
+        "n": f'bot_{i}',
+        "v": 7,
+        "m": random.randint(100000000, 400000000),
+        "c": round(random.uniform(0, 50), 1),
+        "h": {"t": timestamp - 604800, "r": 3600, "c": [round(random.uniform(0, 50), 1) for _ in range(168)], "m": [random.randint(100, 400) for _ in range(168)]}
+    } for i in range(10)]
+    return {
+        "timestamp": timestamp,
+        "startts": timestamp - 86400,
+        "name": name,
+        "api_md5": "0" * 32,
+        "mem": [8000000000, 4000000000, 50.0, 4000000000, 4000000000],
+        "swap": [0, 0, 0, 0.0, 0, 0],
+        "disk": [80000000000, 40000000000, 40000000000, 50.0],
+        "cpu": 12.5,
+        "boot": timestamp - 864000,
+        "monitor": monitor,
+        "upgrades": 0,
+        "reboot": False,
+        "pbgv": "1.0",
+        "pbgc": "0" * 40,
+        "pb6v": "6.0",
+        "pb6c": "0" * 40,
+        "pb7v": "7.0",
+        "pb7c": "0" * 40,
+    }
+
+def write_alive(path: Path, name: str, timestamp: int):
+    cfile = Path(f'{path}/alive_{timestamp}.cmd.gz')
+    with gzip.open(cfile, "wt", encoding='utf-8') as f:
+        json.dump(alive_cfg(name, timestamp), f)
+    shutil.copy(cfile, Path(f'{path}/alive.cmd.gz'))
+
+def create_fleet(root: Path, servers: int):
+    now = round(datetime.now().timestamp())
+    paths = []
+    for i in range(servers):
+        path = Path(f'{root}/cmd_server{i:02d}')
+        path.mkdir(parents=True)
+        for ts in range(now - 600, now, 60):
+            write_alive(path, f'server{i:02d}', ts)
+        paths.append(path)
+    return paths
+
+def load_uncached(path: Path):
+    """RemoteServer.load() before the alive cache: glob, sort, gunzip and parse the newest alive file."""
+    alive_remote = sorted(glob.glob(str(Path(f'{path}/alive_*.cmd*'))))
+    with gzip.open(alive_remote[-1], "rt", encoding='utf-8') as f:
+        return json.load(f)
+
+def bench(name: str, passes: int, load_pass):
+    start = perf_counter()
+    for i in range(passes):
+        load_pass(i)
+    ms = (perf_counter() - start) * 1000 / passes
+    print(f'{name:<40} {ms:8.2f} ms per pass')
+
+def main():
+    servers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    passes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = create_fleet(Path(tmp), servers)
+        rservers = [RemoteServer(str(path)) for path in paths]
+        now = round(datetime.now().timestamp())
+        print(f'{servers} servers, {passes} passes')
+        bench("uncached, no change", passes, lambda i: [load_uncached(path) for path in paths])
+        bench("cached, no change", passes, lambda i: [rserver.load() for rserver in rservers])
+        # one new alive file per pass, like a fleet sending alive every 60s synced every few seconds
+        def changed(i, load):
+            write_alive(paths[i % servers], f'server{i % servers:02d}', now + i)
+            load()
+        bench("uncached, one server changed", passes, lambda i: changed(i, lambda: [load_uncached(path) for path in paths]))
+        bench("cached, one server changed", passes, lambda i: changed(i, lambda: [rserver.load() for rserver in rservers]))
+
+if __name__ == '__main__':
+    main()
@@ -98,6 +98,8 @@ def select_instance():
             remote_str = f'✅ Running {instance.is_running_on()}'
         elif running_on:
             remote_str = f'🔄 Running {running_on}'
+        elif instance.enabled_on != 'disabled' and instance.deferred:
+            remote_str = f'⏳ Deferred ({instance.deferred})'
         elif instance.enabled_on != 'disabled':
             remote_str = '🔄 Activation required'
         else:
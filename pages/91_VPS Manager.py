@@ -11,27 +11,14 @@ import psutil
 def list_vps():
     vpsmanager = st.session_state.vpsmanager
     pbremote = st.session_state.pbremote
-    timestamp = round(datetime.now().timestamp())
-    if timestamp - pbremote.systemts > 3600:
-        with st.spinner("Loading git origins..."):
-            pbremote.local_run.load_git_origin()
-        with st.spinner("Loading versions origins..."):
-            pbremote.local_run.load_versions_origin()
-        with st.spinner("Loading local Versions..."):
-            pbremote.local_run.load_versions()
-        with st.spinner("Loading local git commits..."):
-            pbremote.local_run.load_git_commits()
-        with st.spinner("Loading local Sever available updates..."):
-            pbremote.local_run.has_upgrades()
-        with st.spinner("Loading local Server need reboot"):
-            pbremote.local_run.has_reboot()
-        pbremote.systemts = timestamp
+    # Show cached versions, expired ones are refreshed in the background
+    pbremote.local_run.probe_versions(origin=True)
     # Navigation
     with st.sidebar:
         if st.button(":material/refresh:"):
             vpsmanager.vpss = []
             vpsmanager.find_vps()
-            pbremote.systemts = 0
+            pbremote.local_run.probe_versions(origin=True, force=True)
             st.rerun()
         if st.button(":material/add_box:"):
             st.session_state.init_vps = vpsmanager.add_vps()
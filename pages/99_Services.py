@@ -2,8 +2,16 @@ import streamlit as st
 from pbgui_func import set_page_config, is_session_state_not_initialized, is_authenticted
 import pbgui_help
 from Monitor import Monitor
+from datetime import datetime
+from pbgui_purefunc import service_heartbeat, HEARTBEAT_STALE
 
 
+def heartbeat_warning(service: str):
+    """Warn if a running service holds its lock, but its main loop did not run for a long time."""
+    age = service_heartbeat(service.lower())
+    if age is not None and age > HEARTBEAT_STALE:
+        st.warning(f'{service}: no heartbeat for {round(age)} seconds, it may hang')
+
 def pbrun_overview():
     pbrun = st.session_state.pbrun
     pbrun_status = pbrun.is_running()
@@ -18,6 +26,8 @@ def pbrun_overview():
         pbrun.stop()
         pbrun_icon = '❌'
     st.metric(label="PBRun", value=pbrun_icon)
+    if pbrun_status:
+        heartbeat_warning("PBRun")
 
 def pbremote_overview():
     pbremote = st.session_state.pbremote
@@ -33,6 +43,8 @@ def pbremote_overview():
         pbremote.stop()
         pbremote_icon = '❌'
     st.metric(label="PBRemote", value=pbremote_icon)
+    if pbremote_status:
+        heartbeat_warning("PBRemote")
 
 def pbstat_overview():
     pbstat = st.session_state.pbstat
@@ -48,6 +60,8 @@ def pbstat_overview():
         pbstat.stop()
         pbstat_icon = '❌'
     st.metric(label="PBStat", value=pbstat_icon)
+    if pbstat_status:
+        heartbeat_warning("PBStat")
 
 def pbdata_overview():
     pbdata = st.session_state.pbdata
@@ -63,6 +77,8 @@ def pbdata_overview():
         pbdata.stop()
         pbdata_icon = '❌'
     st.metric(label="PBData", value=pbdata_icon)
+    if pbdata_status:
+        heartbeat_warning("PBData")
 
 def pbcoindata_overview():
     pbcoindata = st.session_state.pbcoindata
@@ -78,6 +94,8 @@ def pbcoindata_overview():
         pbcoindata.stop()
         pbcoindata_icon = '❌'
     st.metric(label="PBCoinData", value=pbcoindata_icon)
+    if pbcoindata_status:
+        heartbeat_warning("PBCoinData")
     
 def overview():
     st.header("Service Status")
@@ -175,6 +193,20 @@ def pbremote_details():
         st.write(f"{api_sync_list}")
         if st.button(f'Sync API-Keys to all',key="sync_api"):
             pbremote.sync_api_up()
+    last_sync = pbremote.load_last_sync()
+    if last_sync:
+        st.header("Last sync from remote servers")
+        now = datetime.now().timestamp()
+        rows = []
+        for name, last in sorted(last_sync.items()):
+            ok = last.get("ok")
+            rows.append({
+                "Server": name,
+                "Last successful sync": datetime.fromtimestamp(ok).isoformat(sep=" ", timespec="seconds") if ok else "never",
+                "Age (s)": round(now - ok) if ok else None,
+                "Error": last.get("error", "")
+            })
+        st.dataframe(rows, hide_index=True)
     if "server" in st.session_state:
         monitor.server = st.session_state.server
         monitor.view_server()
@@ -2,7 +2,20 @@ import json
 import hjson
 import pprint
 import configparser
+import os
+import threading
+import re
+from time import sleep, monotonic
+from datetime import datetime
+import sys
+import psutil
+from io import TextIOWrapper
 from pathlib import Path
+try:
+    import fcntl
+except ImportError:
+    # Windows, services fall back to the pid file and cmdline check
+    fcntl = None
 
 def save_ini(section : str, parameter : str, value : str):
     pb_config = configparser.ConfigParser()
@@ -13,6 +26,22 @@ def save_ini(section : str, parameter : str, value : str):
     with open('pbgui.ini', 'w') as pbgui_configfile:
         pb_config.write(pbgui_configfile)
 
+def save_json_atomic(file, data, **kwargs):
+    """Writes data as json to a temp file and renames it, so readers never see a partially written file."""
+    file = Path(file)
+    tmp = file.with_name(f'.{file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp, "w", encoding='utf-8') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp, file)
+
+def save_text_atomic(file, text: str):
+    """Writes text to a temp file and renames it, so readers never see a partially written file."""
+    file = Path(file)
+    tmp = file.with_name(f'.{file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp, "w", encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, file)
+
 def load_ini(section : str, parameter : str):
     pb_config = configparser.ConfigParser()
     pb_config.read('pbgui.ini')
@@ -41,6 +70,268 @@ def is_pb7_installed():
 
 PBGDIR = Path.cwd()
 
+def git_ref(git_dir, ref: str = "HEAD"):
+    """Returns the commit hash of ref (HEAD, refs/heads/<branch>, refs/remotes/origin/<branch>)
+    by reading the files in git_dir, without running git. None if it can not be resolved."""
+    git_dir = Path(git_dir)
+    if git_dir.is_file():
+        # worktree or submodule: .git is a file with "gitdir: <path>"
+        gitdir = git_dir.read_text(encoding='utf-8').strip()
+        if not gitdir.startswith("gitdir:"):
+            return None
+        git_dir = (git_dir.parent / gitdir[7:].strip()).resolve()
+    common_dir = git_dir
+    if Path(f'{git_dir}/commondir').is_file():
+        common_dir = (git_dir / Path(f'{git_dir}/commondir').read_text(encoding='utf-8').strip()).resolve()
+    # follow symbolic refs like HEAD -> refs/heads/main
+    for _ in range(5):
+        value = None
+        for directory in [git_dir, common_dir]:
+            ref_file = Path(f'{directory}/{ref}')
+            if ref_file.is_file():
+                value = ref_file.read_text(encoding='utf-8').strip()
+                break
+        if value is None:
+            packed_refs = Path(f'{common_dir}/packed-refs')
+            if packed_refs.is_file():
+                for line in packed_refs.read_text(encoding='utf-8').splitlines():
+                    if line.startswith(("#", "^")):
+                        continue
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        value = parts[0]
+                        break
+        if value is None:
+            return None
+        if value.startswith("ref:"):
+            ref = value[4:].strip()
+            continue
+        return value if re.fullmatch(r'[0-9a-f]{40}|[0-9a-f]{64}', value) else None
+    return None
+
+SUPERVISOR_SERVICES = ["PBRun", "PBRemote", "PBData", "PBStat", "PBCoinData"]
+
+class ThreadLog():
+    """sys.stdout and sys.stderr of PBSupervisor.
+
+    Every service runs in a thread named like the service (worker threads use "<service>_<name>").
+    Output of a thread goes to the logfile registered for its service, everything else to the default logfile.
+    """
+    def __init__(self, default):
+        self.lock = threading.Lock()
+        self.default = None
+        self.logs = {}
+        self.set_default(default)
+
+    def set_default(self, logfile):
+        default = self.default
+        self.default = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+        if default:
+            default.close()
+
+    def service(self):
+        return threading.current_thread().name.split("_")[0]
+
+    def register(self, logfile):
+        """(Re)open logfile for the service of the current thread."""
+        service = self.service()
+        with self.lock:
+            if service in self.logs:
+                self.logs[service].close()
+            self.logs[service] = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+
+    def unregister(self):
+        service = self.service()
+        with self.lock:
+            log = self.logs.pop(service, None)
+        if log:
+            log.close()
+
+    def stream(self):
+        with self.lock:
+            return self.logs.get(self.service(), self.default)
+
+    def write(self, text):
+        try:
+            return self.stream().write(text)
+        except ValueError:
+            # logfile was closed by a rotation in the meantime
+            return self.default.write(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+def set_logfile(logfile):
+    """Redirect stdout and stderr to logfile. Under PBSupervisor only the output of the calling service is redirected."""
+    if isinstance(sys.stdout, ThreadLog):
+        sys.stdout.register(logfile)
+    else:
+        sys.stdout = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+        sys.stderr = TextIOWrapper(open(logfile,"ab",0), write_through=True)
+
+def reset_logfile():
+    """Undo set_logfile(), used to print errors on the console before exit."""
+    if isinstance(sys.stdout, ThreadLog):
+        sys.stdout.unregister()
+    else:
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+
+def supervisor_pid():
+    """Returns the pid of the running PBSupervisor or None."""
+    pidfile = Path(f'{PBGDIR}/data/pid/pbsupervisor.pid')
+    if not pidfile.exists():
+        return None
+    pid = pidfile.read_text().strip()
+    if not pid.isnumeric():
+        return None
+    try:
+        if any(sub.lower().endswith("pbsupervisor.py") for sub in psutil.Process(int(pid)).cmdline()):
+            return int(pid)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        pass
+    return None
+
+def supervisor_services():
+    """Services hosted by PBSupervisor, from pbgui.ini [supervisor] services (default all)."""
+    services = load_ini("supervisor", "services")
+    if not services:
+        return SUPERVISOR_SERVICES
+    services = [service.strip().lower() for service in services.split(",")]
+    return [service for service in SUPERVISOR_SERVICES if service.lower() in services]
+
+def supervisor_request(service: str, action: str, pid: int = None, timeout: int = 60):
+    """Ask the running PBSupervisor to start or stop service and wait until it is done.
+
+    Args:
+        service (str): PBRun, PBRemote, PBData, PBStat or PBCoinData
+        action (str): start or stop
+        pid (int): pid the service is running in, only send the request if this is the PBSupervisor
+
+    Returns:
+        bool: False if the service is not hosted by a running PBSupervisor.
+    """
+    my_pid = supervisor_pid()
+    if not my_pid or service not in supervisor_services():
+        return False
+    if pid is not None and pid != my_pid:
+        return False
+    request = Path(f'{PBGDIR}/data/pid/{service.lower()}.{action}')
+    request.touch()
+    for _ in range(timeout):
+        if not request.exists():
+            break
+        sleep(1)
+    return True
+
+# Liveness of the services by lock file.
+# A running service holds an exclusive flock on data/pid/<name>.lock, the file contains its pid and its mtime is the
+# heartbeat of the service. The lock is released by the kernel when the process dies, so checking it is one flock()
+# call without reading the process table.
+SERVICE_LOCKS = {}
+ALIVE_CACHE = {}
+ALIVE_TTL = 2
+
+def service_lockfile(name: str):
+    return Path(f'{PBGDIR}/data/pid/{name}.lock')
+
+def lock_service(name: str, retry: float = 0):
+    """Take the lock of service name for this process. Returns False if another process holds it.
+
+    Args:
+        retry (float): Seconds to retry, the shared lock of a liveness probe is only held for a moment.
+    """
+    if fcntl is None:
+        return True
+    lockfile = service_lockfile(name)
+    lockfile.parent.mkdir(parents=True, exist_ok=True)
+    f = open(lockfile, "a+")
+    deadline = monotonic() + retry
+    while True:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            if monotonic() >= deadline:
+                f.close()
+                return False
+            sleep(0.1)
+    f.truncate(0)
+    f.write(str(os.getpid()))
+    f.flush()
+    SERVICE_LOCKS[name] = f
+    ALIVE_CACHE.pop(name, None)
+    return True
+
+def unlock_service(name: str):
+    """Release the lock of service name, used when a service thread of PBSupervisor ends."""
+    f = SERVICE_LOCKS.pop(name, None)
+    if f:
+        f.close()
+    ALIVE_CACHE.pop(name, None)
+
+def forget_service(name: str):
+    """Drop the cached liveness of service name after it was started or stopped."""
+    ALIVE_CACHE.pop(name, None)
+
+def heartbeat_service(name: str):
+    """Touch the lock file of service name, call it from the main loop."""
+    f = SERVICE_LOCKS.get(name)
+    if f:
+        try:
+            os.utime(f.fileno())
+        except OSError:
+            pass
+
+def service_alive(name: str, cached: bool = True):
+    """Check the lock of service name.
+
+    Returns:
+        bool: True if a process holds the lock, False if not, None if unknown (no flock or no lock file).
+    """
+    if fcntl is None:
+        return None
+    if cached and name in ALIVE_CACHE:
+        ts, alive = ALIVE_CACHE[name]
+        if monotonic() - ts < ALIVE_TTL:
+            return alive
+    if name in SERVICE_LOCKS:
+        alive = True
+    else:
+        try:
+            with open(service_lockfile(name), "r") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                    alive = False
+                except OSError:
+                    alive = True
+        except FileNotFoundError:
+            return None
+    ALIVE_CACHE[name] = (monotonic(), alive)
+    return alive
+
+def service_pid(name: str):
+    """pid written into the lock file of service name or None."""
+    try:
+        pid = service_lockfile(name).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return int(pid) if pid.isnumeric() else None
+
+# seconds without heartbeat after which a running service is shown as hanging, PBStat and PBCoinData
+# wait 60s per loop and their fetches can take minutes
+HEARTBEAT_STALE = 900
+
+def service_heartbeat(name: str):
+    """Seconds since the last heartbeat of service name or None."""
+    try:
+        return datetime.now().timestamp() - service_lockfile(name).stat().st_mtime
+    except FileNotFoundError:
+        return None
+
 def validateJSON(jsonData):
     try:
         json.loads(jsonData)
@@ -0,0 +1,63 @@
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from PBRun import PBRun
+
+class FakeRun():
+    def __init__(self, path: str):
+        self.path = path
+
+def worker_pool():
+    pbrun = PBRun.__new__(PBRun)
+    pbrun._executor = None
+    pbrun.start_workers = 2
+    pbrun.pending = {}
+    pbrun.queued = {}
+    pbrun.pending_lock = threading.Lock()
+    return pbrun
+
+class TestSubmit(unittest.TestCase):
+    def test_stop_during_start(self):
+        pbrun = worker_pool()
+        run = FakeRun("data/run_v7/bot")
+        calls = []
+        starting = threading.Event()
+        release = threading.Event()
+        stopped = threading.Event()
+        def start():
+            calls.append("start")
+            starting.set()
+            release.wait(5)
+        def stop():
+            calls.append("stop")
+            stopped.set()
+        self.assertTrue(pbrun.submit(run, start))
+        self.assertTrue(starting.wait(5))
+        # disable arrives while the start is running
+        self.assertFalse(pbrun.submit(run, stop))
+        release.set()
+        self.assertTrue(stopped.wait(5))
+        pbrun.executor.shutdown(wait=True)
+        self.assertEqual(calls, ["start", "stop"])
+        self.assertEqual(pbrun.pending, {})
+        self.assertEqual(pbrun.queued, {})
+
+    def test_newest_queued_tasks_win(self):
+        pbrun = worker_pool()
+        run = FakeRun("data/run_v7/bot")
+        calls = []
+        release = threading.Event()
+        done = threading.Event()
+        pbrun.submit(run, lambda: release.wait(5))
+        pbrun.submit(run, lambda: calls.append("restart"))
+        pbrun.submit(run, lambda: calls.append("stop"), done.set)
+        release.set()
+        self.assertTrue(done.wait(5))
+        pbrun.executor.shutdown(wait=True)
+        self.assertEqual(calls, ["stop"])
+
+if __name__ == '__main__':
+    unittest.main()